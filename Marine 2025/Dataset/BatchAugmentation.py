@@ -0,0 +1,119 @@
+from math import pi
+from torch import rand, randint, zeros, stack, tensor, arange, meshgrid, cos, sin, einsum, float32, uint8
+from torch.nn.functional import affine_grid, grid_sample, pad, conv2d
+from torch.utils.data import default_collate
+from configurationFile import RESOLUTION, MAX_CROP_SIDE
+
+class BatchAugmentation:
+    # Batched counterpart of the per-sample albumentations pipeline of MyDataset.
+    # Used as the collate function of the training DataLoader, so that each worker augments a whole (B, C, H, W) batch at once.
+    # Every sample still draws its own random parameters, and images and masks share the same geometric transformation.
+    def __init__(self, outputSize = RESOLUTION, cropRange = (RESOLUTION[0], MAX_CROP_SIDE), rotationProbability = 0.5,
+                 jitterProbability = 0.5, jitterStrength = 0.05, blurProbability = 0.5, blurLimit = (3, 9)):
+        self.outputSize = outputSize
+        self.cropRange = cropRange
+        self.rotationProbability = rotationProbability
+        self.jitterProbability = jitterProbability
+        self.jitterStrength = jitterStrength
+        self.blurProbability = blurProbability
+        self.blurLimit = blurLimit
+        # Conversion between RGB and YIQ, where hue shifts become rotations of the chrominance plane.
+        self.RGBToYIQ = tensor([[0.299, 0.587, 0.114], [0.596, -0.274, -0.322], [0.211, -0.523, 0.312]])
+        self.YIQToRGB = self.RGBToYIQ.inverse()
+
+    def __call__(self, batch):
+        images, masks = default_collate(batch)
+        return self.augment(images, masks)
+
+    def augment(self, images, masks):
+        if images.dtype == uint8:
+            images = images.to(float32) / 255
+        images, masks = self.cropAndRotate(images, masks)
+        images = self.colorJitter(images)
+        images = self.motionBlur(images)
+        return images, masks
+
+    def cropAndRotate(self, images, masks):
+        # Equivalent of RandomSizedCrop followed by a random multiple of 90 degrees rotation, expressed as a single affine grid.
+        B, C, H, W = images.shape
+        cropSize = randint(self.cropRange[0], self.cropRange[1] + 1, (B,)).clamp(max = min(H, W)).to(float32)
+        offsetX = rand(B) * (W - cropSize)
+        offsetY = rand(B) * (H - cropSize)
+        # Grid coordinates are normalized to [-1, 1].
+        centerX = (offsetX + cropSize / 2) / W * 2 - 1
+        centerY = (offsetY + cropSize / 2) / H * 2 - 1
+        scaleX = cropSize / W
+        scaleY = cropSize / H
+
+        # Rotation by 90, 180 or 270 degrees, applied with the given probability.
+        quarterTurns = randint(1, 4, (B,)) * (rand(B) < self.rotationProbability)
+        angle = quarterTurns.to(float32) * pi / 2
+        cosine = cos(angle).round()
+        sine = sin(angle).round()
+        theta = stack([stack([scaleX * cosine, -scaleX * sine, centerX], dim = 1),
+                       stack([scaleY * sine, scaleY * cosine, centerY], dim = 1)], dim = 1)
+
+        grid = affine_grid(theta, (B, C, *self.outputSize), align_corners = False)
+        images = grid_sample(images, grid, mode = 'bilinear', padding_mode = 'reflection', align_corners = False)
+        # Nearest neighbour sampling ensures that no new class indices are introduced.
+        masks = grid_sample(masks.unsqueeze(1).to(float32), grid, mode = 'nearest', padding_mode = 'reflection', align_corners = False)
+        return images, masks.squeeze(1).long()
+
+    def randomFactors(self, B, applied, centre):
+        # Samples that are not augmented receive the neutral factor.
+        factors = centre + (rand(B) * 2 - 1) * self.jitterStrength
+        return factors.where(applied, centre)
+
+    def colorJitter(self, images):
+        B = images.shape[0]
+        applied = rand(B) < self.jitterProbability
+        brightness = self.randomFactors(B, applied, 1.0).view(B, 1, 1, 1)
+        contrast = self.randomFactors(B, applied, 1.0).view(B, 1, 1, 1)
+        saturation = self.randomFactors(B, applied, 1.0).view(B, 1, 1, 1)
+        hue = self.randomFactors(B, applied, 0.0)
+        weights = self.RGBToYIQ[0].view(1, 3, 1, 1)
+
+        images = (images * brightness).clamp(0, 1)
+        gray = (images * weights).sum(dim = 1, keepdim = True)
+        images = (contrast * images + (1 - contrast) * gray.mean(dim = (2, 3), keepdim = True)).clamp(0, 1)
+        gray = (images * weights).sum(dim = 1, keepdim = True)
+        images = (saturation * images + (1 - saturation) * gray).clamp(0, 1)
+
+        # Hue is shifted by rotating the chrominance (I, Q) plane, using one 3x3 matrix per sample.
+        angle = hue * 2 * pi
+        rotation = zeros(B, 3, 3)
+        rotation[:, 0, 0] = 1
+        rotation[:, 1, 1] = cos(angle)
+        rotation[:, 1, 2] = -sin(angle)
+        rotation[:, 2, 1] = sin(angle)
+        rotation[:, 2, 2] = cos(angle)
+        transform = self.YIQToRGB @ rotation @ self.RGBToYIQ
+        return einsum('bij,bjhw->bihw', transform, images).clamp(0, 1)
+
+    def motionBlur(self, images):
+        # Line kernels of random odd length and orientation, convolved with all samples at once as a grouped convolution.
+        B, C, H, W = images.shape
+        maxSize = self.blurLimit[1]
+        radius = maxSize // 2
+        applied = rand(B) < self.blurProbability
+        lengths = randint(self.blurLimit[0] // 2, radius + 1, (B,)) * 2 + 1
+        angle = rand(B) * pi
+
+        offsets = arange(-radius, radius + 1, dtype = float32)
+        dy, dx = meshgrid(offsets, offsets, indexing = 'ij')
+        sine = sin(angle).view(B, 1, 1)
+        cosine = cos(angle).view(B, 1, 1)
+        # Weights fall off linearly with the distance from the line, which is truncated to the kernel length.
+        distance = (dx * sine - dy * cosine).abs()
+        projection = (dx * cosine + dy * sine).abs()
+        kernels = (1 - distance).clamp(min = 0) * (projection <= ((lengths - 1) / 2).view(B, 1, 1))
+        kernels = kernels / kernels.sum(dim = (1, 2), keepdim = True)
+
+        # Samples that are not blurred receive the identity kernel.
+        identity = zeros(maxSize, maxSize)
+        identity[radius, radius] = 1
+        kernels = kernels.where(applied.view(B, 1, 1), identity)
+        weight = kernels.repeat_interleave(C, dim = 0).unsqueeze(1)
+
+        padded = pad(images.reshape(1, B * C, H, W), (radius, radius, radius, radius), mode = 'reflect')
+        return conv2d(padded, weight, groups = B * C).view(B, C, H, W)
\ No newline at end of file
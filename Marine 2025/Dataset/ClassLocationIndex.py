@@ -0,0 +1,60 @@
+import numpy as np
+from os import cpu_count
+from concurrent.futures import ThreadPoolExecutor
+from MyDataset import MyDataset
+from maskCodec import loadMask
+from configurationFile import SEED, NUM_CLASSES, TRAINING_PATH
+
+class ClassLocationIndex:
+    def __init__(self, rootPath, stride = 8, maxLocations = 256):
+        # Index stores, for every mask, a sample of the locations of each class and the exact class pixel counts.
+        # Locations are normalized to [0, 1], so that they remain valid for prescaled or draft-decoded samples.
+        self.rootPath = rootPath
+        self.indexPath = self.rootPath / 'Masks' / 'ClassLocations.npz'
+        self.stride = stride
+        self.maxLocations = maxLocations
+        self.buildIndex()
+
+    def indexMask(self, maskPath):
+        mask = loadMask(maskPath)
+        height, width = mask.shape
+        generator = np.random.default_rng([SEED, height, width])
+        # Class pixel counts are exact, whereas locations are gathered on a regular grid, in a single pass over the mask.
+        classCounts = np.bincount(mask.ravel(), minlength = NUM_CLASSES)[:NUM_CLASSES]
+        grid = mask[self.stride // 2::self.stride, self.stride // 2::self.stride]
+        rows, columns = np.indices(grid.shape)
+        order = np.argsort(grid.ravel(), kind = 'stable')
+        sortedClasses = grid.ravel()[order]
+        coordinates = np.stack([(rows.ravel()[order] * self.stride + self.stride // 2 + 0.5) / height,
+                                (columns.ravel()[order] * self.stride + self.stride // 2 + 0.5) / width], axis = 1)
+
+        # Locations are subsampled per class, bounding the size of the index.
+        boundaries = np.searchsorted(sortedClasses, np.arange(NUM_CLASSES + 1))
+        locations = []
+        for classIndex in range(NUM_CLASSES):
+            classCoordinates = coordinates[boundaries[classIndex]:boundaries[classIndex + 1]]
+            if len(classCoordinates) > self.maxLocations:
+                classCoordinates = classCoordinates[generator.choice(len(classCoordinates), self.maxLocations, replace = False)]
+            locations.append(classCoordinates.astype(np.float16))
+        return classCounts, locations
+
+    def buildIndex(self):
+        samples = MyDataset(self.rootPath, augmentationFlag = False).dataset
+        with ThreadPoolExecutor(max_workers = cpu_count()) as executor:
+            results = list(executor.map(lambda sample: self.indexMask(sample[1]), samples))
+
+        # Ragged per-class location lists are flattened into one array, addressed through offsets of shape (N, C + 1).
+        names = np.array([imagePath.stem for imagePath, _ in samples])
+        classCounts = np.array([counts for counts, _ in results], dtype = np.int64).reshape(len(samples), NUM_CLASSES)
+        lengths = np.array([[len(classLocations) for classLocations in locations] for _, locations in results],
+                           dtype = np.int64).reshape(len(samples), NUM_CLASSES)
+        offsets = np.concatenate([np.zeros((len(samples), 1), dtype = np.int64), lengths], axis = 1).cumsum(axis = 1)
+        totals = lengths.sum(axis = 1)
+        offsets += (totals.cumsum() - totals)[:, None]
+        locations = np.concatenate([classLocations for _, locations in results for classLocations in locations] or [np.zeros((0, 2))])
+        np.savez(self.indexPath, names = names, classCounts = classCounts, offsets = offsets, locations = locations.astype(np.float16))
+        print(f'Class location index of {len(samples)} masks saved to {self.indexPath}.')
+
+if __name__ == '__main__':
+    # Only the training subset is cropped randomly.
+    ClassLocationIndex(TRAINING_PATH)
\ No newline at end of file
@@ -0,0 +1,101 @@
+import numpy as np
+from json import dump, load
+from os import replace, getpid
+from hashlib import sha1
+from os import cpu_count
+from struct import unpack_from
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from maskCodec import decodeMask, findMasks, HEADER
+from configurationFile import NUM_CLASSES, ALL_PATH, TRAINING_PATH, VALIDATION_PATH, TESTING_PATH
+
+def folderTimes(imageFolder, maskFolder):
+    # Modification times of the folders change whenever files are added, removed or renamed.
+    return [imageFolder.stat().st_mtime_ns, maskFolder.stat().st_mtime_ns]
+
+def loadManifest(manifestPath, imageFolder, maskFolder):
+    # Samples of the manifest, or None if files have been added to or removed from the subset since it was built.
+    # Folders are only listed when their times differ from those recorded in the manifest.
+    with open(manifestPath, 'r') as f:
+        manifest = load(f)
+    currentTimes = folderTimes(imageFolder, maskFolder)
+    if manifest.get('folderTimes') != currentTimes:
+        # Folder times also change when other files are written, e.g. ClassLocations.npz, so file counts are compared before concluding.
+        if manifest.get('numImages') != len(list(imageFolder.glob('*.jpg'))) or manifest.get('numMasks') != len(findMasks(maskFolder)):
+            return None
+        # Unchanged counts are recorded with the new times, so that subsequent loads do not list the folders again.
+        # Manifest is replaced atomically, since other processes may be reading it at the same time.
+        manifest['folderTimes'] = currentTimes
+        temporaryPath = manifestPath.with_suffix(f'.{getpid()}.tmp')
+        with open(temporaryPath, 'w') as f:
+            dump(manifest, f, indent = 4)
+        replace(temporaryPath, manifestPath)
+    return manifest['samples']
+
+class DatasetManifest:
+    def __init__(self, rootPath):
+        # Manifest records every valid sample of a subset, so that MyDataset does not need to glob and pair files.
+        self.rootPath = rootPath
+        self.imageFolder = self.rootPath / 'Images'
+        self.maskFolder = self.rootPath / 'Masks'
+        self.manifestPath = self.rootPath / 'Manifest.json'
+        self.buildManifest()
+
+    def readMask(self, maskPath):
+        # Return the decoded mask, together with the format in which it is stored.
+        buffer = maskPath.read_bytes()
+        if maskPath.suffix == '.pmk':
+            bits = unpack_from(HEADER, buffer)[1]
+            return decodeMask(buffer), f'{bits}-bit packed', buffer
+        mask = np.load(maskPath)
+        return mask, str(mask.dtype), buffer
+
+    def scanSample(self, imagePath, maskPath):
+        # Image dimensions are read from the file header, without decoding.
+        imageBytes = imagePath.read_bytes()
+        with Image.open(imagePath) as image:
+            width, height = image.size
+        mask, maskDtype, maskBytes = self.readMask(maskPath)
+
+        issues = []
+        if mask.shape != (height, width):
+            issues.append(f'image is {width}x{height}, but mask is {mask.shape[1]}x{mask.shape[0]}')
+        histogram = np.bincount(mask.astype(np.int64).ravel(), minlength = NUM_CLASSES)
+        if len(histogram) > NUM_CLASSES:
+            issues.append(f'mask contains class index {len(histogram) - 1}, but only {NUM_CLASSES} classes are defined')
+
+        contentHash = sha1(imageBytes)
+        contentHash.update(maskBytes)
+        record = {'name': imagePath.stem, 'image': imagePath.name, 'mask': maskPath.name, 'width': width, 'height': height,
+                  'maskDtype': maskDtype, 'classHistogram': histogram[:NUM_CLASSES].tolist(), 'contentHash': contentHash.hexdigest()}
+        return record, issues
+
+    def buildManifest(self):
+        # Samples are paired by name, so that a missing file only affects its own sample.
+        imagePaths = {path.stem: path for path in self.imageFolder.glob('*.jpg')}
+        maskPaths = findMasks(self.maskFolder)
+        issues = [{'name': name, 'issue': 'image without mask'} for name in sorted(imagePaths.keys() - maskPaths.keys())]
+        issues += [{'name': name, 'issue': 'mask without image'} for name in sorted(maskPaths.keys() - imagePaths.keys())]
+        names = sorted(imagePaths.keys() & maskPaths.keys())
+
+        # Scanning is dominated by file reads, hashing and decoding, which release the GIL.
+        with ThreadPoolExecutor(max_workers = cpu_count()) as executor:
+            results = list(executor.map(lambda name: self.scanSample(imagePaths[name], maskPaths[name]), names))
+
+        samples = []
+        for record, sampleIssues in results:
+            if sampleIssues:
+                issues += [{'name': record['name'], 'issue': issue} for issue in sampleIssues]
+            else:
+                samples.append(record)
+
+        with open(self.manifestPath, 'w') as f:
+            dump({'numClasses': NUM_CLASSES, 'numImages': len(imagePaths), 'numMasks': len(maskPaths),
+                  'folderTimes': folderTimes(self.imageFolder, self.maskFolder), 'samples': samples, 'issues': issues}, f, indent = 4)
+        print(f'Manifest of {self.rootPath} saved to {self.manifestPath}: {len(samples)} valid samples, {len(issues)} issues.')
+        for issue in issues:
+            print(f'{issue["name"]}: {issue["issue"]}.')
+
+if __name__ == '__main__':
+    for path in [ALL_PATH, TRAINING_PATH, VALIDATION_PATH, TESTING_PATH]:
+        DatasetManifest(path)
\ No newline at end of file
@@ -0,0 +1,56 @@
+import numpy as np
+from json import dump
+from PIL import Image
+from MyDataset import MyDataset
+from maskCodec import loadMask
+from imageScaling import draftImage, prescaleSample
+from configurationFile import MAX_CROP_SIDE, TRAINING_PATH, VALIDATION_PATH, TESTING_PATH
+
+class DatasetPacker:
+    def __init__(self, rootPath, minimumSide, folderName = 'Packed'):
+        # Pre-decoded samples are stored inside the subset folder, next to the original files.
+        # Samples are kept at their native resolution when no minimum side is given.
+        self.rootPath = rootPath
+        self.outputDirectory = self.rootPath / folderName
+        self.minimumSide = minimumSide
+        self.packDataset()
+
+    def packDataset(self):
+        # All images and masks are written back-to-back into two flat binary files.
+        # Offset index allows each sample to be sliced out of a memory map without copying.
+        self.outputDirectory.mkdir(parents = True, exist_ok = True)
+        dataset = MyDataset(self.rootPath, augmentationFlag = False)
+        samples = []
+        imageOffset = 0
+        maskOffset = 0
+
+        with open(self.outputDirectory / 'Images.bin', 'wb') as imageFile, open(self.outputDirectory / 'Masks.bin', 'wb') as maskFile:
+            for imagePath, maskPath in dataset.dataset:
+                # Shrink the sample so that its shorter side matches the largest crop that may be requested.
+                mask = loadMask(maskPath)
+                if self.minimumSide is None:
+                    image = Image.open(imagePath).convert('RGB')
+                else:
+                    image = draftImage(imagePath, minimumSide = self.minimumSide)
+                    image, mask = prescaleSample(image, mask, self.minimumSide)
+                image = np.ascontiguousarray(image, dtype = np.uint8)
+                mask = np.ascontiguousarray(mask, dtype = np.uint8)
+                if image.shape[:2] != mask.shape:
+                    print(f'Shape mismatch between {imagePath.name} and {maskPath.name}. Skipping sample.')
+                    continue
+
+                imageFile.write(image.tobytes())
+                maskFile.write(mask.tobytes())
+                height, width = mask.shape
+                samples.append({'name': imagePath.stem, 'imageOffset': imageOffset, 'maskOffset': maskOffset,
+                                'height': height, 'width': width})
+                imageOffset += image.nbytes
+                maskOffset += mask.nbytes
+
+        with open(self.outputDirectory / 'Index.json', 'w') as f:
+            dump({'minimumSide': self.minimumSide, 'samples': samples}, f, indent = 4)
+        print(f'Packed {len(samples)} samples from {self.rootPath} into {self.outputDirectory}.')
+
+if __name__ == '__main__':
+    for path in [TRAINING_PATH, VALIDATION_PATH, TESTING_PATH]:
+        DatasetPacker(path, minimumSide = MAX_CROP_SIDE)
\ No newline at end of file
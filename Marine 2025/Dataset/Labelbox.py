@@ -5,6 +5,7 @@ from requests.exceptions import RequestException
 from time import sleep
 from os.path import splitext
 from PIL import Image
+from maskCodec import saveMask
 from configurationFile import CLASS_DICTIONARY, ALL_PATH, LABELBOX_API_KEY, METADATA_PATH
 
 class Labelbox:
@@ -99,9 +100,8 @@ class Labelbox:
                 continue
             ID, fullMask = result
 
-            # Save the mask locally as an NPY file.
-            outputPath = self.outputDirectory / f'{ID}.npy'
-            np.save(outputPath, fullMask)
+            # Save the mask locally, in compact or NPY format.
+            outputPath = saveMask(self.outputDirectory, ID, fullMask)
             print(f'Saved mask for {ID} to {outputPath}.')
         
         self.saveMetadata()
@@ -1,49 +1,263 @@
+import cv2
 import numpy as np
 import albumentations as A
+from random import random, randint, randrange, choices
+from hashlib import sha1
+from os import replace, getpid
+from tqdm import tqdm
 from torch import from_numpy, float32
 from PIL import Image
 from torch.utils.data import Dataset
 from torchvision.transforms.v2 import Compose, ToImage, ToDtype
-from configurationFile import RESOLUTION
+from maskCodec import loadMask, findMasks
+from DatasetManifest import loadManifest
+from PackedStore import PackedStore
+from StageProfiler import StageProfiler
+from fileLock import fileLock
+from imageScaling import draftImage, matchMask, prescaleSample
+from configurationFile import RESOLUTION, MAX_CROP_SIDE, NUM_CLASSES, RARE_CLASS_RATE, PROFILING_PATH
+
+def getTransformCompose(augmentationFlag, batchAugmentationFlag = False, cropFlag = True):
+    if augmentationFlag and batchAugmentationFlag:
+        # Augmentation is deferred to BatchAugmentation.py, which requires samples of equal size for collation.
+        # Each sample is reduced to a random square window, from which the batched crop is subsequently taken.
+        return A.Compose([A.SmallestMaxSize(max_size = MAX_CROP_SIDE), A.RandomCrop(height = MAX_CROP_SIDE, width = MAX_CROP_SIDE)],
+                         additional_targets = {'mask': 'mask'})
+    elif augmentationFlag:
+        # Cropping may instead be performed by the dataset itself, as in the rare-class cropping mode.
+        cropTransform = [A.RandomSizedCrop(min_max_height = (RESOLUTION[0], MAX_CROP_SIDE), size = RESOLUTION, p = 1.0)] if cropFlag else []
+        return A.Compose(cropTransform + [A.OneOf([A.Rotate(limit = (90, 90), p = 1.0), A.Rotate(limit = (180, 180), p = 1.0),
+                                                   A.Rotate(limit = (270, 270), p = 1.0)], p = 0.5),
+                                          A.ColorJitter(brightness = 0.05, contrast = 0.05, saturation = 0.05, hue = 0.05, p = 0.5),
+                                          A.MotionBlur(blur_limit = (3, 9), p = 0.5)],
+                         additional_targets = {'mask': 'mask'})
+    else:
+        return A.Compose([A.Resize(RESOLUTION[0], RESOLUTION[1])], additional_targets = {'mask': 'mask'})
+
+def getToTensor(uint8Flag):
+    # Images may be kept as uint8, deferring scaling until after the transfer to the device.
+    return ToImage() if uint8Flag else Compose([ToImage(), ToDtype(float32, scale = True)])
 
 class MyDataset(Dataset):
-    def __init__(self, rootPath, augmentationFlag):
+    def __init__(self, rootPath, augmentationFlag, packedFlag = False, draftFlag = False, batchAugmentationFlag = False, cacheFlag = False,
+                 uint8Flag = False, rareClassFlag = False, profileFlag = False, profilingPath = PROFILING_PATH):
         self.rootPath = rootPath
         self.imageFolder = self.rootPath / 'Images'
         self.maskFolder = self.rootPath / 'Masks'
+        self.packedFolder = self.rootPath / 'Packed'
+        self.cacheFolder = self.rootPath / 'Cache'
+        self.manifestPath = self.rootPath / 'Manifest.json'
         self.augmentationFlag = augmentationFlag
+        self.packedFlag = packedFlag
+        self.draftFlag = draftFlag
+        self.batchAugmentationFlag = batchAugmentationFlag
+        # Deterministic samples (no augmentation) may be materialized once and reused across epochs and trials.
+        self.cacheFlag = cacheFlag and not augmentationFlag
+        # Samples may be emitted as uint8, deferring scaling and label widening until after the transfer to the device.
+        self.uint8Flag = uint8Flag
+        # Crop windows may be biased towards under-represented classes, using the index created by ClassLocationIndex.py.
+        self.rareClassFlag = rareClassFlag and augmentationFlag and not batchAugmentationFlag
 
-        # Implement lazy loading of files to reduce computational overhead.
-        self.imagePaths = sorted(list(self.imageFolder.glob('*.jpg')))
-        self.maskPaths = sorted(list(self.maskFolder.glob('*.npy')))
-        self.dataset = [(imagePath, maskPath) for imagePath, maskPath in zip(self.imagePaths, self.maskPaths)
-                        if imagePath.name.replace('.jpg', '.npy') == maskPath.name]
-        
-        # Define transformation pipeline.
-        if self.augmentationFlag:
-            self.transformCompose = A.Compose([A.RandomSizedCrop(min_max_height = (RESOLUTION[0], 2*RESOLUTION[0]), size = RESOLUTION, p = 1.0),
-                                               A.OneOf([A.Rotate(limit = (90, 90), p = 1.0), A.Rotate(limit = (180, 180), p = 1.0),
-                                                        A.Rotate(limit = (270, 270), p = 1.0)], p = 0.5),
-                                               A.ColorJitter(brightness = 0.05, contrast = 0.05, saturation = 0.05, hue = 0.05, p = 0.5),
-                                               A.MotionBlur(blur_limit = (3, 9), p = 0.5)],
-                                               additional_targets = {'mask': 'mask'})
+        if self.packedFlag:
+            # Samples are read from the pre-decoded store, created by DatasetPacker.py.
+            self.packedStore = PackedStore(self.packedFolder)
+            self.dataset = self.packedStore.samples
+        elif self.manifestPath.exists() and (samples := self.loadManifest()) is not None:
+            # Samples are read from the manifest created by DatasetManifest.py, which avoids listing large folders.
+            self.dataset = [(self.imageFolder / sample['image'], self.maskFolder / sample['mask']) for sample in samples]
         else:
-            self.transformCompose = A.Compose([A.Resize(RESOLUTION[0], RESOLUTION[1])], additional_targets = {'mask': 'mask'})
+            # Implement lazy loading of files to reduce computational overhead.
+            # Masks may be stored either in compact or in NPY format.
+            self.imagePaths = sorted(list(self.imageFolder.glob('*.jpg')))
+            self.maskPaths = findMasks(self.maskFolder)
+            self.dataset = [(imagePath, self.maskPaths[imagePath.stem]) for imagePath in self.imagePaths
+                            if imagePath.stem in self.maskPaths]
 
-        self.toTensor = Compose([ToImage(), ToDtype(float32, scale = True)])
+        # Define transformation pipeline.
+        self.transformCompose = getTransformCompose(self.augmentationFlag, self.batchAugmentationFlag, cropFlag = not self.rareClassFlag)
+        if self.rareClassFlag:
+            self.loadClassLocations()
+        self.toTensor = getToTensor(self.uint8Flag)
+
+        # Stage timings may be recorded for every sample, to be summarized per epoch by the training loop.
+        # Profiler is only attached after the cache is built, so that caching does not appear in the records.
+        self.profiler = None
+        if self.cacheFlag:
+            self.imageCache = None
+            self.maskCache = None
+            self.cachePaths = self.getCachePaths()
+            if not self.cachePaths[0].exists():
+                self.buildCache()
+        self.profiler = StageProfiler(profilingPath, self.rootPath.name) if profileFlag else None
 
     def __len__(self):
         return len(self.dataset)
 
-    def __getitem__(self, index):
-        # Getter ensures masks are in the correct form.
+    def loadManifest(self):
+        # Manifest is only trusted while no files have been added to or removed from the subset since it was built.
+        samples = loadManifest(self.manifestPath, self.imageFolder, self.maskFolder)
+        if samples is None:
+            print(f'Manifest {self.manifestPath} is out of date. Listing the folders instead. Run DatasetManifest.py to rebuild it.')
+        return samples
+
+    def __getstate__(self):
+        # Memory maps must not be pickled into DataLoader workers, since that would copy the whole cache.
+        state = self.__dict__.copy()
+        if self.cacheFlag:
+            state['imageCache'] = None
+            state['maskCache'] = None
+        return state
+
+    def getCachePaths(self):
+        # Cache is keyed by the resolution, the data source and the modification times of the underlying files.
+        # Any change in the subset therefore leads to a new cache, rather than to stale samples.
+        if self.packedFlag:
+            sourceFiles = [self.packedFolder / 'Index.json', self.packedFolder / 'Images.bin']
+        else:
+            sourceFiles = [path for sample in self.dataset for path in sample]
+        key = sha1(f'{RESOLUTION}-{self.packedFlag}-{self.draftFlag}'.encode())
+        for path in sourceFiles:
+            key.update(f'{path.name}-{path.stat().st_mtime_ns}'.encode())
+        key = key.hexdigest()[:16]
+        return self.cacheFolder / f'{key}-Images.npy', self.cacheFolder / f'{key}-Masks.npy'
+
+    def buildCache(self):
+        # Resized samples are written into two NPY files, which are subsequently memory-mapped by every worker.
+        # Processes building the same cache at once, e.g. parallel trial workers, wait for the first one instead of overwriting its files.
+        self.cacheFolder.mkdir(parents = True, exist_ok = True)
+        imagePath, maskPath = self.cachePaths
+        with fileLock(self.cacheFolder / 'Cache'):
+            if imagePath.exists():
+                return
+            self.writeCache(imagePath, maskPath)
+            self.removeStaleCaches()
+
+    def writeCache(self, imagePath, maskPath):
+        # Temporary files are named after the process, so that files left behind by an interrupted build are never reused.
+        temporaryPaths = [path.with_suffix(f'.{getpid()}.tmp') for path in self.cachePaths]
+        images = np.lib.format.open_memmap(temporaryPaths[0], mode = 'w+', dtype = np.uint8, shape = (len(self), *RESOLUTION, 3))
+        masks = np.lib.format.open_memmap(temporaryPaths[1], mode = 'w+', dtype = np.uint8, shape = (len(self), *RESOLUTION))
+        for index in tqdm(range(len(self)), desc = f'Caching {self.rootPath.name}'):
+            images[index], masks[index] = self.transformSample(index)
+        images.flush()
+        masks.flush()
+        del images, masks
+
+        # Renaming only after completion ensures that interrupted runs never leave a partial cache behind.
+        replace(temporaryPaths[1], maskPath)
+        replace(temporaryPaths[0], imagePath)
+
+    def removeStaleCaches(self):
+        # Caches of other keys belong to a previous subset, resolution or set of options, and would otherwise accumulate indefinitely.
+        # Temporary files are only written while the lock is held, so any that remain were left behind by interrupted builds.
+        for path in list(self.cacheFolder.glob('*.npy')) + list(self.cacheFolder.glob('*.tmp')):
+            if path not in self.cachePaths:
+                try:
+                    path.unlink()
+                except PermissionError:
+                    # Windows does not allow files memory-mapped by a running process to be removed.
+                    print(f'Stale cache {path} is in use and was not removed.')
+
+    def measure(self, stage, function, *args, **kwargs):
+        if self.profiler is None:
+            return function(*args, **kwargs)
+        return self.profiler.measure(stage, function, *args, **kwargs)
+
+    def loadCachedSample(self, index):
+        if self.imageCache is None:
+            self.imageCache = np.load(self.cachePaths[0], mmap_mode = 'r')
+            self.maskCache = np.load(self.cachePaths[1], mmap_mode = 'r')
+        # Copies are required, since tensors cannot share read-only memory.
+        return np.array(self.imageCache[index]), np.array(self.maskCache[index])
+
+    def loadSample(self, index):
+        imagePath, maskPath = self.dataset[index]
+        # Opening only parses the header, whereas decoding takes place upon conversion.
+        image = self.measure('Open', Image.open, imagePath)
+        image = self.measure('Decode', lambda: np.array(image.convert('RGB')))
+        mask = self.measure('Mask', loadMask, maskPath)
+        return image, mask
+
+    def loadDraftSample(self, index):
+        # Decode at the smallest JPEG scale that still covers what the transformation pipeline requires.
         imagePath, maskPath = self.dataset[index]
-        image = np.array(Image.open(imagePath).convert('RGB'))
-        mask = np.load(maskPath).astype(np.uint8)
+        mask = loadMask(maskPath)
+        if self.augmentationFlag:
+            # Crops are taken from a sample whose shorter side matches the largest crop window, as in DatasetPacker.py.
+            image = draftImage(imagePath, minimumSide = MAX_CROP_SIDE)
+            image, mask = prescaleSample(image, mask, MAX_CROP_SIDE)
+        else:
+            # Resizing only requires both sides to cover the target resolution.
+            image = draftImage(imagePath, requestedSize = (RESOLUTION[1], RESOLUTION[0]))
+            mask = matchMask(mask, image.size)
+        return np.array(image), mask
+
+    def loadClassLocations(self):
+        index = np.load(self.maskFolder / 'ClassLocations.npz')
+        self.locationRows = {name: row for row, name in enumerate(index['names'])}
+        self.classCounts = index['classCounts']
+        self.classOffsets = index['offsets']
+        self.classLocations = index['locations']
+        # Classes are favoured in inverse proportion to their share of the pixels of the subset.
+        totalCounts = self.classCounts.sum(axis = 0)
+        self.classWeights = totalCounts.sum() / np.maximum(totalCounts, 1)
+
+    def sampleName(self, index):
+        return self.dataset[index]['name'] if self.packedFlag else self.dataset[index][0].stem
+
+    def rareClassCentre(self, index):
+        # Pick a class present in the sample, favouring rare ones, and return one of its normalized locations.
+        row = self.locationRows.get(self.sampleName(index))
+        if row is None:
+            return None
+        offsets = self.classOffsets[row]
+        weights = self.classWeights * (np.diff(offsets) > 0)
+        if weights.sum() == 0:
+            return None
+        classIndex = choices(range(NUM_CLASSES), weights = weights)[0]
+        return self.classLocations[offsets[classIndex] + randrange(offsets[classIndex + 1] - offsets[classIndex])].astype(float)
+
+    def cropSample(self, image, mask, index):
+        # Equivalent of RandomSizedCrop, except that a share of the crop windows is centred on under-represented classes.
+        height, width = mask.shape
+        cropSize = min(randint(RESOLUTION[0], MAX_CROP_SIDE), height, width)
+        centre = self.rareClassCentre(index) if random() < RARE_CLASS_RATE else None
+        if centre is None:
+            top = randint(0, height - cropSize)
+            left = randint(0, width - cropSize)
+        else:
+            top = int(np.clip(centre[0] * height - cropSize / 2, 0, height - cropSize))
+            left = int(np.clip(centre[1] * width - cropSize / 2, 0, width - cropSize))
+
+        image = cv2.resize(image[top:top + cropSize, left:left + cropSize], (RESOLUTION[1], RESOLUTION[0]), interpolation = cv2.INTER_LINEAR)
+        mask = cv2.resize(mask[top:top + cropSize, left:left + cropSize], (RESOLUTION[1], RESOLUTION[0]), interpolation = cv2.INTER_NEAREST)
+        return image, mask
+
+    def transformSample(self, index):
+        if self.packedFlag:
+            image, mask = self.measure('Packed', lambda: self.packedStore[index])
+        elif self.draftFlag:
+            image, mask = self.measure('Draft', self.loadDraftSample, index)
+        else:
+            image, mask = self.loadSample(index)
+        if self.rareClassFlag:
+            image, mask = self.measure('RareClassCrop', self.cropSample, image, mask, index)
+        if self.profiler is not None:
+            return self.profiler.transform(self.transformCompose, image, mask)
         result = self.transformCompose(image = image, mask = mask)
-        transformedImage = result['image']
-        transformedMask = result['mask']
+        return result['image'], result['mask']
+
+    def __getitem__(self, index):
+        # Getter ensures masks are in the correct form.
+        if self.cacheFlag:
+            transformedImage, transformedMask = self.measure('Cache', self.loadCachedSample, index)
+        else:
+            transformedImage, transformedMask = self.transformSample(index)
 
-        imageTensor = self.toTensor(transformedImage)
-        maskTensor = from_numpy(transformedMask).long()
+        imageTensor = self.measure('ToTensor', self.toTensor, transformedImage)
+        maskTensor = from_numpy(transformedMask)
+        if not self.uint8Flag:
+            maskTensor = maskTensor.long()
+        if self.profiler is not None:
+            self.profiler.commit()
         return imageTensor, maskTensor
\ No newline at end of file
@@ -0,0 +1,97 @@
+import numpy as np
+from io import BytesIO
+from json import load
+from struct import unpack
+from torch import from_numpy, randint
+from PIL import Image
+from torch.utils.data import IterableDataset, get_worker_info
+from MyDataset import getTransformCompose, getToTensor
+from ShardWriter import RECORD_HEADER, RECORD_HEADER_SIZE
+from maskCodec import decodeMask
+from imageScaling import draftImage, matchMask, prescaleSample
+from configurationFile import RESOLUTION, MAX_CROP_SIDE
+
+class MyIterableDataset(IterableDataset):
+    # Streaming counterpart of MyDataset, reading the shards written by ShardWriter.py.
+    def __init__(self, rootPath, augmentationFlag, shuffleFlag, bufferSize = 256, draftFlag = False, batchAugmentationFlag = False,
+                 uint8Flag = False):
+        self.rootPath = rootPath
+        self.shardFolder = self.rootPath / 'Shards'
+        self.augmentationFlag = augmentationFlag
+        self.shuffleFlag = shuffleFlag
+        self.bufferSize = bufferSize
+        self.draftFlag = draftFlag
+        self.uint8Flag = uint8Flag
+        with open(self.shardFolder / 'Index.json', 'r') as f:
+            index = load(f)
+        self.shards = index['shards']
+        self.numSamples = index['numSamples']
+        # Persistent workers keep the same seed across epochs, so the epoch count is mixed into the shuffling seed.
+        self.epoch = 0
+
+        self.transformCompose = getTransformCompose(self.augmentationFlag, batchAugmentationFlag)
+        self.toTensor = getToTensor(self.uint8Flag)
+
+    def __len__(self):
+        return self.numSamples
+
+    def readShard(self, shard):
+        # Records are read one at a time through a large sequential buffer, so memory use does not grow with the size of the shards.
+        # Every record is a separate bytes object, so records held by the shuffle buffer do not keep the rest of the shard alive.
+        with open(self.shardFolder / shard['file'], 'rb', buffering = 2**22) as f:
+            while header := f.read(RECORD_HEADER_SIZE):
+                nameLength, imageLength, maskLength = unpack(RECORD_HEADER, header)
+                f.seek(nameLength, 1)
+                yield f.read(imageLength), f.read(maskLength)
+
+    def decodeSample(self, imageBytes, maskBytes):
+        mask = decodeMask(maskBytes)
+        if not self.draftFlag:
+            image = Image.open(BytesIO(imageBytes)).convert('RGB')
+        elif self.augmentationFlag:
+            image = draftImage(BytesIO(imageBytes), minimumSide = MAX_CROP_SIDE)
+            image, mask = prescaleSample(image, mask, MAX_CROP_SIDE)
+        else:
+            image = draftImage(BytesIO(imageBytes), requestedSize = (RESOLUTION[1], RESOLUTION[0]))
+            mask = matchMask(mask, image.size)
+        return np.array(image), mask
+
+    def transformSample(self, imageBytes, maskBytes):
+        image, mask = self.decodeSample(imageBytes, maskBytes)
+        result = self.transformCompose(image = image, mask = mask)
+        imageTensor = self.toTensor(result['image'])
+        maskTensor = from_numpy(result['mask'])
+        if not self.uint8Flag:
+            maskTensor = maskTensor.long()
+        return imageTensor, maskTensor
+
+    def __iter__(self):
+        # Shard order is shared by all workers of an epoch, since it derives from the common base seed of the DataLoader.
+        # Each worker then reads an interleaved share of the shards. getDataloaders ensures that there are no more workers than shards.
+        workerInfo = get_worker_info()
+        if workerInfo is None:
+            workerID, numWorkers, baseSeed = 0, 1, randint(2**62, (1,)).item()
+        else:
+            workerID, numWorkers, baseSeed = workerInfo.id, workerInfo.num_workers, workerInfo.seed - workerInfo.id
+        baseSeed += self.epoch
+        self.epoch += 1
+        shardOrder = np.random.default_rng(baseSeed).permutation(len(self.shards)) if self.shuffleFlag else range(len(self.shards))
+        workerShards = [self.shards[i] for i in shardOrder][workerID::numWorkers]
+        generator = np.random.default_rng(baseSeed + workerID + 1)
+
+        # Shuffle buffer holds undecoded records, which are only decoded once they are emitted.
+        buffer = []
+        for shard in workerShards:
+            for record in self.readShard(shard):
+                if not self.shuffleFlag:
+                    yield self.transformSample(*record)
+                elif len(buffer) < self.bufferSize:
+                    buffer.append(record)
+                else:
+                    index = generator.integers(self.bufferSize)
+                    yield self.transformSample(*buffer[index])
+                    buffer[index] = record
+
+        generator.shuffle(buffer)
+        for record in buffer:
+            yield self.transformSample(*record)
\ No newline at end of file
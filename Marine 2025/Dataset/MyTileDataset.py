@@ -0,0 +1,48 @@
+import numpy as np
+from torch import from_numpy
+from torch.utils.data import Dataset
+from MyDataset import getTransformCompose, getToTensor
+from PackedStore import PackedStore
+from configurationFile import CLASS_DICTIONARY
+
+class MyTileDataset(Dataset):
+    # Tiled counterpart of MyDataset, sampling native-resolution tiles indexed by TileIndex.py instead of downscaled images.
+    def __init__(self, rootPath, augmentationFlag, uint8Flag = False, skipBackgroundFlag = False):
+        self.rootPath = rootPath
+        self.storeFolder = self.rootPath / 'Packed Native'
+        self.augmentationFlag = augmentationFlag
+        self.uint8Flag = uint8Flag
+        self.store = PackedStore(self.storeFolder)
+        tiles = np.load(self.storeFolder / 'Tiles.npz')
+        self.tileSize = tuple(tiles['tileSize'])
+        # Per-tile class histograms allow tiles showing nothing but background to be left out, since they contain no hull.
+        histograms = tiles['histograms']
+        keep = histograms[:, CLASS_DICTIONARY['Background/Other']['index']] < histograms.sum(axis = 1) if skipBackgroundFlag else slice(None)
+        self.sampleIndices = tiles['sampleIndices'][keep]
+        self.offsets = tiles['offsets'][keep]
+        self.histograms = histograms[keep]
+        if skipBackgroundFlag:
+            print(f'Skipping {len(histograms) - len(self.histograms)} background-only tiles of {len(histograms)} in {self.rootPath.name}.')
+
+        # Tiles already have the target size, so neither cropping nor resizing takes place.
+        self.transformCompose = getTransformCompose(self.augmentationFlag, cropFlag = False) if self.augmentationFlag else None
+        self.toTensor = getToTensor(self.uint8Flag)
+
+    def __len__(self):
+        return len(self.sampleIndices)
+
+    def __getitem__(self, index):
+        # Only the pages covering the tile are read from the memory-mapped store.
+        image, mask = self.store[self.sampleIndices[index]]
+        top, left = self.offsets[index]
+        image = np.array(image[top:top + self.tileSize[0], left:left + self.tileSize[1]])
+        mask = np.array(mask[top:top + self.tileSize[0], left:left + self.tileSize[1]])
+        if self.transformCompose is not None:
+            result = self.transformCompose(image = image, mask = mask)
+            image, mask = result['image'], result['mask']
+
+        imageTensor = self.toTensor(image)
+        maskTensor = from_numpy(mask)
+        if not self.uint8Flag:
+            maskTensor = maskTensor.long()
+        return imageTensor, maskTensor
\ No newline at end of file
@@ -0,0 +1,35 @@
+import numpy as np
+from json import load
+
+class PackedStore:
+    # Read access to the flat image and mask files written by DatasetPacker.py.
+    def __init__(self, folder):
+        self.folder = folder
+        with open(self.folder / 'Index.json', 'r') as f:
+            self.samples = load(f)['samples']
+        # Memory maps are opened lazily, so that each DataLoader worker maps the files itself and shares the page cache.
+        self.imageStore = None
+        self.maskStore = None
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getstate__(self):
+        # Memory maps must not be pickled into DataLoader workers, since that would copy the whole store.
+        state = self.__dict__.copy()
+        state['imageStore'] = None
+        state['maskStore'] = None
+        return state
+
+    def __getitem__(self, index):
+        if self.imageStore is None:
+            self.imageStore = np.memmap(self.folder / 'Images.bin', dtype = np.uint8, mode = 'r')
+            self.maskStore = np.memmap(self.folder / 'Masks.bin', dtype = np.uint8, mode = 'r')
+
+        # Slicing a memory map returns a view, so no decoding or copying takes place.
+        # Regions of the returned arrays are only read from disk once they are accessed.
+        sample = self.samples[index]
+        height, width = sample['height'], sample['width']
+        image = self.imageStore[sample['imageOffset']:sample['imageOffset'] + height*width*3].reshape(height, width, 3)
+        mask = self.maskStore[sample['maskOffset']:sample['maskOffset'] + height*width].reshape(height, width)
+        return image, mask
\ No newline at end of file
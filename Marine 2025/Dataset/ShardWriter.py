@@ -0,0 +1,45 @@
+import numpy as np
+from json import dump
+from struct import pack, calcsize
+from MyDataset import MyDataset
+from maskCodec import encodeMask
+from configurationFile import TRAINING_PATH, VALIDATION_PATH, TESTING_PATH
+
+# Every record consists of a header with the lengths of the sample name, the JPEG file and the compact mask, followed by the three fields.
+RECORD_HEADER = '<III'
+RECORD_HEADER_SIZE = calcsize(RECORD_HEADER)
+
+class ShardWriter:
+    def __init__(self, rootPath, numShards):
+        # A subset is packed into a few large shard files, which are read sequentially by MyIterableDataset.py.
+        # Images are kept as the original JPEG bytes and masks are stored in compact format, so shards remain small.
+        self.rootPath = rootPath
+        self.outputDirectory = self.rootPath / 'Shards'
+        self.numShards = numShards
+        self.writeShards()
+
+    def encodeRecord(self, imagePath, maskPath):
+        name = imagePath.stem.encode()
+        imageBytes = imagePath.read_bytes()
+        maskBytes = maskPath.read_bytes() if maskPath.suffix == '.pmk' else encodeMask(np.load(maskPath))
+        return pack(RECORD_HEADER, len(name), len(imageBytes), len(maskBytes)) + name + imageBytes + maskBytes
+
+    def writeShards(self):
+        self.outputDirectory.mkdir(parents = True, exist_ok = True)
+        samples = MyDataset(self.rootPath, augmentationFlag = False).dataset
+        # Samples are distributed evenly, so that every DataLoader worker receives a similar amount of work.
+        shards = []
+        for shardIndex, shardSamples in enumerate(np.array_split(np.arange(len(samples)), min(self.numShards, len(samples)))):
+            fileName = f'shard-{shardIndex:05d}.bin'
+            with open(self.outputDirectory / fileName, 'wb') as f:
+                for sampleIndex in shardSamples:
+                    f.write(self.encodeRecord(*samples[sampleIndex]))
+            shards.append({'file': fileName, 'numSamples': len(shardSamples)})
+
+        with open(self.outputDirectory / 'Index.json', 'w') as f:
+            dump({'numSamples': len(samples), 'shards': shards}, f, indent = 4)
+        print(f'Wrote {len(samples)} samples from {self.rootPath} into {len(shards)} shards at {self.outputDirectory}.')
+
+if __name__ == '__main__':
+    for path in [TRAINING_PATH, VALIDATION_PATH, TESTING_PATH]:
+        ShardWriter(path, numShards = 16)
\ No newline at end of file
@@ -0,0 +1,85 @@
+import numpy as np
+from os import getpid
+from json import dumps, loads
+from time import perf_counter
+
+class StageProfiler:
+    # Records the wall time of every stage of the sample pipeline, e.g. decoding or each albumentations transform.
+    # Each DataLoader worker appends its records to a file of its own, so no synchronization between processes is required.
+    def __init__(self, folder, subset):
+        self.folder = folder
+        self.subset = subset
+        self.folder.mkdir(parents = True, exist_ok = True)
+        # File is opened lazily, so that every worker process writes into a separate file.
+        self.file = None
+        self.timings = {}
+
+    def __getstate__(self):
+        # File handles must not be pickled into DataLoader workers.
+        state = self.__dict__.copy()
+        state['file'] = None
+        state['timings'] = {}
+        return state
+
+    def measure(self, stage, function, *args, **kwargs):
+        # Stages executed repeatedly for the same sample accumulate their time.
+        start = perf_counter()
+        result = function(*args, **kwargs)
+        self.timings[stage] = self.timings.get(stage, 0) + perf_counter() - start
+        return result
+
+    def transform(self, transformCompose, image, mask):
+        # Transforms of the pipeline are applied one at a time, so that each of them can be timed separately.
+        for transform in transformCompose.transforms:
+            result = self.measure(type(transform).__name__, transform, image = image, mask = mask)
+            image, mask = result['image'], result['mask']
+        return image, mask
+
+    def commit(self):
+        # One line per sample. Flushing immediately keeps the records visible to the main process at the end of each epoch.
+        # Records are written in binary mode, so that line endings are never translated and byte offsets remain exact on every platform.
+        if self.file is None:
+            self.file = open(self.folder / f'{self.subset}-{getpid()}.jsonl', 'ab')
+        self.file.write((dumps(self.timings) + '\n').encode())
+        self.file.flush()
+        self.timings = {}
+
+def clearProfiles(folder):
+    # Records of previous studies are discarded, including those of parallel trial workers in subfolders.
+    # Files must not be removed while workers are alive, since they keep them open.
+    for path in folder.rglob('*.jsonl'):
+        path.unlink()
+
+def profileOffsets(folder):
+    # Current end of every record file, from which the records of a new trial start.
+    return {path.name: path.stat().st_size for path in folder.glob('*.jsonl')}
+
+def aggregateProfiles(folder, offsets):
+    # Summarize the records appended since the previous call, per subset and per stage, in milliseconds.
+    # Offsets are kept per file rather than truncating files, since persistent workers keep their files open between epochs.
+    timings = {}
+    for path in sorted(folder.glob('*.jsonl')):
+        with open(path, 'rb') as f:
+            f.seek(offsets.get(path.name, 0))
+            lines = f.readlines()
+        # Partially written lines are left for the next call.
+        if lines and not lines[-1].endswith(b'\n'):
+            lines = lines[:-1]
+        offsets[path.name] = offsets.get(path.name, 0) + sum(len(line) for line in lines)
+        subset = path.stem.rsplit('-', 1)[0]
+        for line in lines:
+            record = loads(line)
+            record['Total'] = sum(record.values())
+            for stage, duration in record.items():
+                timings.setdefault(subset, {}).setdefault(stage, []).append(duration * 1000)
+
+    summary = {}
+    for subset, stages in timings.items():
+        summary[subset] = {}
+        for stage, durations in stages.items():
+            durations = np.array(durations)
+            p50, p90, p99 = np.percentile(durations, [50, 90, 99])
+            summary[subset][stage] = {'samples': len(durations), 'meanMs': round(float(durations.mean()), 4),
+                                      'p50Ms': round(float(p50), 4), 'p90Ms': round(float(p90), 4), 'p99Ms': round(float(p99), 4),
+                                      'totalSeconds': round(float(durations.sum()) / 1000, 4)}
+    return summary
\ No newline at end of file
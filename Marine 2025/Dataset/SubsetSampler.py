@@ -0,0 +1,22 @@
+from torch import randperm
+from torch.utils.data import Sampler
+
+class SubsetSampler(Sampler):
+    # Shuffling sampler whose subset of indices may be changed between epochs, e.g. by the multi-fidelity schedule.
+    # Sampling takes place in the main process, so changes also apply to persistent DataLoader workers.
+    def __init__(self, numSamples):
+        self.numSamples = numSamples
+        self.indices = None
+
+    def setSubset(self, indices):
+        # None restores the full dataset.
+        self.indices = indices
+
+    def __len__(self):
+        return self.numSamples if self.indices is None else len(self.indices)
+
+    def __iter__(self):
+        order = randperm(len(self)).tolist()
+        if self.indices is None:
+            return iter(order)
+        return iter([self.indices[i] for i in order])
\ No newline at end of file
@@ -2,6 +2,7 @@ import numpy as np
 from json import load
 from shutil import copy
 from iterstrat.ml_stratifiers import MultilabelStratifiedShuffleSplit
+from maskCodec import findMask
 from configurationFile import SEED, NUM_CLASSES, SPLIT_RATIOS, ALL_PATH, METADATA_PATH, TRAINING_PATH, VALIDATION_PATH, TESTING_PATH
 
 class SubsetSplit:
@@ -77,9 +78,14 @@ class SubsetSplit:
         print(f'Testing Class Distribution: {testingDistribution}')
     
     def copySubset(self, subset, path):
+        # Manifest of a previous split no longer describes the subset.
+        (path / 'Manifest.json').unlink(missing_ok = True)
+        (path / 'Images').mkdir(parents = True, exist_ok = True)
+        (path / 'Masks').mkdir(parents = True, exist_ok = True)
         for ID in subset:
             copy(self.rootPath / 'Images' / f'{ID}.jpg', path / 'Images' / f'{ID}.jpg')
-            copy(self.rootPath / 'Masks' / f'{ID}.npy', path / 'Masks' / f'{ID}.npy')
+            maskPath = findMask(self.rootPath / 'Masks', ID)
+            copy(maskPath, path / 'Masks' / maskPath.name)
 
     def splitDataset(self):
         # Split the original dataset into training, validation and testing subsets.
@@ -0,0 +1,96 @@
+import cv2
+import numpy as np
+from json import dump
+from argparse import ArgumentParser
+from pathlib import Path
+from PIL import Image
+from maskCodec import saveMask
+from configurationFile import SEED, CLASS_DICTIONARY, NUM_CLASSES
+
+class SyntheticDataset:
+    def __init__(self, outputPath, numSamples, resolution = (1080, 1440), classMix = None, presenceRate = 0.7, quality = 90):
+        # Generates a dataset with the layout of ALL_PATH, so that the whole pipeline can be benchmarked without the real data.
+        # Samples consist of smooth blobs per class, each with its own colour and texture, in proportions given by the class mix.
+        self.outputPath = outputPath
+        self.imageFolder = self.outputPath / 'Images'
+        self.maskFolder = self.outputPath / 'Masks'
+        self.numSamples = numSamples
+        self.resolution = resolution
+        # Class mix maps class names of CLASS_DICTIONARY to relative pixel shares, and defaults to equal shares.
+        classMix = classMix or {className: 1 for className in CLASS_DICTIONARY}
+        self.classWeights = np.zeros(NUM_CLASSES)
+        for className, weight in classMix.items():
+            self.classWeights[CLASS_DICTIONARY[className]['index']] = weight
+        self.classWeights /= self.classWeights.sum()
+        # Each class is absent from a share of the samples, so that the subsets can be stratified by SubsetSplit.py.
+        self.presenceRate = presenceRate
+        self.quality = quality
+        # Class colours are those of CLASS_DICTIONARY, darkened and desaturated to resemble hull imagery.
+        self.classColors = np.zeros((NUM_CLASSES, 3))
+        for properties in CLASS_DICTIONARY.values():
+            self.classColors[properties['index']] = 0.4 * np.array(properties['color']) + 60
+        self.generateDataset()
+
+    def smoothNoise(self, generator, shape, scale):
+        # Gaussian noise upsampled from a coarse grid gives structures of roughly the requested scale.
+        height, width = shape
+        coarse = generator.standard_normal((max(height // scale, 2), max(width // scale, 2))).astype(np.float32)
+        return cv2.resize(coarse, (width, height), interpolation = cv2.INTER_CUBIC)
+
+    def generateMask(self, generator):
+        # Each pixel takes the class with the highest biased noise field, which results in blobs of irregular shape.
+        presentClasses = generator.random(NUM_CLASSES) < self.presenceRate
+        presentClasses &= self.classWeights > 0
+        if not presentClasses.any():
+            presentClasses[generator.choice(NUM_CLASSES, p = self.classWeights)] = True
+        scale = min(self.resolution) // 8
+        fields = np.stack([self.smoothNoise(generator, self.resolution, scale) for _ in range(NUM_CLASSES)])
+        # Logarithm of the weights shifts each field, so that pixel shares follow the class mix.
+        fields += np.log(np.maximum(self.classWeights, 1e-12))[:, None, None].astype(np.float32)
+        fields[~presentClasses] = -np.inf
+        return fields.argmax(axis = 0).astype(np.uint8)
+
+    def generateImage(self, generator, mask):
+        # Texture differs per class in scale and strength, e.g. fine grain for soft fouling and coarse patches for hard fouling.
+        image = self.classColors[mask]
+        for classIndex in np.unique(mask).tolist():
+            scale = 2 + 6 * classIndex
+            texture = self.smoothNoise(generator, self.resolution, scale) * (10 + 8 * classIndex)
+            image[mask == classIndex] += texture[mask == classIndex, None]
+        # Global illumination gradient and sensor noise.
+        image *= 0.8 + 0.2 * self.smoothNoise(generator, self.resolution, min(self.resolution))[..., None].clip(-1, 1)
+        image += generator.normal(0, 4, image.shape)
+        image = cv2.GaussianBlur(image.clip(0, 255).astype(np.uint8), (3, 3), 0)
+        return image
+
+    def generateDataset(self):
+        # Synthetic samples must never be mixed into an existing dataset, such as the real one at ALL_PATH.
+        if self.outputPath.exists() and any(self.outputPath.iterdir()):
+            print(f'{self.outputPath} is not empty. Synthetic datasets are only written into empty folders.')
+            raise FileExistsError(self.outputPath)
+        self.imageFolder.mkdir(parents = True, exist_ok = True)
+        self.maskFolder.mkdir(parents = True, exist_ok = True)
+        metadata = {}
+        for ID in range(self.numSamples):
+            # Every sample has its own generator, so that samples are reproducible irrespective of the dataset size.
+            generator = np.random.default_rng([SEED, ID])
+            mask = self.generateMask(generator)
+            image = self.generateImage(generator, mask)
+            Image.fromarray(image).save(self.imageFolder / f'{ID}.jpg', quality = self.quality)
+            saveMask(self.maskFolder, ID, mask)
+            metadata[ID] = {'uniqueClassIndices': np.unique(mask).tolist()}
+
+        # Metadata has the same structure as the one created by Labelbox.py.
+        metadataPath = self.maskFolder / 'Metadata.json'
+        with open(metadataPath, 'w') as f:
+            dump(metadata, f, indent = 4)
+        print(f'Generated {self.numSamples} synthetic samples of resolution {self.resolution} at {self.outputPath}.')
+
+if __name__ == '__main__':
+    # Output folder is always given explicitly. To train on synthetic data, generate it into the ALL folder of a separate inputs folder,
+    # and point INPUTS_PATH to that inputs folder.
+    parser = ArgumentParser(description = 'Generate a synthetic dataset with the layout of ALL_PATH.')
+    parser.add_argument('outputPath', type = Path, help = 'Empty or new folder to write the dataset into.')
+    parser.add_argument('--samples', type = int, default = 200, help = 'Number of samples to generate.')
+    arguments = parser.parse_args()
+    SyntheticDataset(arguments.outputPath, numSamples = arguments.samples)
\ No newline at end of file
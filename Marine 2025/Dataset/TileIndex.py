@@ -0,0 +1,54 @@
+import numpy as np
+from DatasetPacker import DatasetPacker
+from PackedStore import PackedStore
+from configurationFile import NUM_CLASSES, RESOLUTION, TRAINING_PATH, VALIDATION_PATH
+
+class TileIndex:
+    def __init__(self, rootPath, tileSize = RESOLUTION, stride = RESOLUTION):
+        # Tiles are taken from the native-resolution store, which is packed first if it does not exist.
+        self.rootPath = rootPath
+        self.storeFolder = self.rootPath / 'Packed Native'
+        self.tileSize = tileSize
+        self.stride = stride
+        if not (self.storeFolder / 'Index.json').exists():
+            DatasetPacker(self.rootPath, minimumSide = None, folderName = 'Packed Native')
+        self.store = PackedStore(self.storeFolder)
+        self.buildIndex()
+
+    def tileOffsets(self, length, tileLength, stride):
+        # Regular grid, with a final tile aligned to the border so that the whole image is covered.
+        offsets = list(range(0, length - tileLength + 1, stride))
+        if offsets and offsets[-1] != length - tileLength:
+            offsets.append(length - tileLength)
+        return offsets
+
+    def buildIndex(self):
+        sampleIndices = []
+        offsets = []
+        histograms = []
+        for index in range(len(self.store)):
+            _, mask = self.store[index]
+            height, width = mask.shape
+            rows = self.tileOffsets(height, self.tileSize[0], self.stride[0])
+            columns = self.tileOffsets(width, self.tileSize[1], self.stride[1])
+            if not rows or not columns:
+                print(f'Sample {self.store.samples[index]["name"]} is smaller than a tile. Skipping sample.')
+                continue
+
+            for top in rows:
+                for left in columns:
+                    tile = mask[top:top + self.tileSize[0], left:left + self.tileSize[1]]
+                    sampleIndices.append(index)
+                    offsets.append((top, left))
+                    histograms.append(np.bincount(tile.ravel(), minlength = NUM_CLASSES)[:NUM_CLASSES])
+
+        path = self.storeFolder / 'Tiles.npz'
+        np.savez(path, tileSize = np.array(self.tileSize), sampleIndices = np.array(sampleIndices, dtype = np.int64),
+                 offsets = np.array(offsets, dtype = np.int64).reshape(-1, 2),
+                 histograms = np.array(histograms, dtype = np.int64).reshape(-1, NUM_CLASSES))
+        print(f'Indexed {len(sampleIndices)} tiles from {len(self.store)} samples at {path}.')
+
+if __name__ == '__main__':
+    # Validation must also be performed on tiles, since the model is trained at native scale.
+    for path in [TRAINING_PATH, VALIDATION_PATH]:
+        TileIndex(path)
\ No newline at end of file
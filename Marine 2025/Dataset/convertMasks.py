@@ -0,0 +1,29 @@
+import numpy as np
+from maskCodec import encodeMask, decodeMask
+from configurationFile import ALL_PATH, TRAINING_PATH, VALIDATION_PATH, TESTING_PATH
+
+def convertMasks(maskFolder, deleteOriginals = False):
+    # Convert existing NPY masks to the compact format, verifying that every conversion is lossless.
+    originalSize = 0
+    compactSize = 0
+    for NPYPath in sorted(maskFolder.glob('*.npy')):
+        mask = np.load(NPYPath).astype(np.uint8)
+        buffer = encodeMask(mask)
+        if not np.array_equal(decodeMask(buffer), mask):
+            print(f'Round trip failed for {NPYPath.name}. Keeping NPY file.')
+            continue
+
+        compactPath = NPYPath.with_suffix('.pmk')
+        compactPath.write_bytes(buffer)
+        originalSize += NPYPath.stat().st_size
+        compactSize += len(buffer)
+        if deleteOriginals:
+            NPYPath.unlink()
+
+    if compactSize > 0:
+        print(f'Converted masks in {maskFolder}: {originalSize / 1e6:.1f} MB -> {compactSize / 1e6:.1f} MB '
+              f'({originalSize / compactSize:.1f}x smaller).')
+
+if __name__ == '__main__':
+    for path in [ALL_PATH, TRAINING_PATH, VALIDATION_PATH, TESTING_PATH]:
+        convertMasks(path / 'Masks')
\ No newline at end of file
@@ -0,0 +1,34 @@
+import numpy as np
+from math import ceil
+from PIL import Image
+
+def coveringSize(size, minimumSide):
+    # Smallest (width, height) that preserves the aspect ratio and keeps the shorter side at or above minimumSide.
+    width, height = size
+    scale = min(1, minimumSide / min(width, height))
+    return ceil(width * scale), ceil(height * scale)
+
+def draftImage(imagePath, requestedSize = None, minimumSide = None):
+    # JPEG decoder can downscale by 1/2, 1/4 or 1/8 in the DCT domain, skipping most of the decoding work.
+    # Draft mode picks the largest such reduction that keeps both sides at or above the requested (width, height).
+    # Only the file header is read before the draft is configured.
+    image = Image.open(imagePath)
+    if minimumSide is not None:
+        requestedSize = coveringSize(image.size, minimumSide)
+    image.draft('RGB', requestedSize)
+    return image.convert('RGB')
+
+def matchMask(mask, size):
+    # Nearest neighbour interpolation ensures that no new class indices are introduced.
+    if mask.shape != (size[1], size[0]):
+        mask = np.array(Image.fromarray(mask).resize(size, Image.NEAREST))
+    return mask
+
+def prescaleSample(image, mask, minimumSide):
+    # Shrink the sample so that its shorter side matches minimumSide.
+    # Samples that are already small enough are never upscaled.
+    width, height = image.size
+    scale = minimumSide / min(width, height)
+    if scale < 1:
+        image = image.resize((round(width * scale), round(height * scale)), Image.BILINEAR)
+    return image, matchMask(mask, image.size)
\ No newline at end of file
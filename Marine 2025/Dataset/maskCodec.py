@@ -0,0 +1,87 @@
+import numpy as np
+from struct import pack, unpack_from, calcsize
+from zlib import compress, decompress
+from configurationFile import NUM_CLASSES, COMPACT_MASKS
+
+# Compact masks store each pixel in the minimum number of bits needed for NUM_CLASSES.
+# The bit-packed payload is additionally deflated, since masks consist of large uniform regions.
+# Header layout: magic, bits per pixel, compression flag, height, width.
+MAGIC = b'PMSK'
+HEADER = '<4sBBII'
+HEADER_SIZE = calcsize(HEADER)
+# Compact masks take precedence over NPY masks with the same name.
+MASK_SUFFIXES = ('.pmk', '.npy')
+
+def bitsPerPixel(numClasses):
+    return max(1, (numClasses - 1).bit_length())
+
+def encodeMask(mask, numClasses = NUM_CLASSES, compressionFlag = True):
+    mask = np.ascontiguousarray(mask, dtype = np.uint8)
+    if mask.max(initial = 0) >= numClasses:
+        raise ValueError(f'Mask contains class index {mask.max()}, but only {numClasses} classes are defined.')
+
+    # Split every pixel into its bits (most significant first) and pack them contiguously.
+    bits = bitsPerPixel(numClasses)
+    shifts = np.arange(bits - 1, -1, -1, dtype = np.uint8)
+    bitPlanes = (mask.reshape(-1, 1) >> shifts) & 1
+    payload = np.packbits(bitPlanes.ravel()).tobytes()
+    if compressionFlag:
+        payload = compress(payload, 1)
+
+    height, width = mask.shape
+    return pack(HEADER, MAGIC, bits, int(compressionFlag), height, width) + payload
+
+def decodeMask(buffer):
+    magic, bits, compressionFlag, height, width = unpack_from(HEADER, buffer)
+    if magic != MAGIC:
+        raise ValueError('Buffer does not contain a compact mask.')
+    payload = memoryview(buffer)[HEADER_SIZE:]
+    if compressionFlag:
+        payload = decompress(payload)
+    payload = np.frombuffer(payload, dtype = np.uint8)
+    numPixels = height * width
+
+    if 8 % bits == 0:
+        # Fast path: whole pixels fit in a byte, so every pixel is extracted with a single shift and bitwise and.
+        pixelsPerByte = 8 // bits
+        shifts = np.arange(pixelsPerByte - 1, -1, -1, dtype = np.uint8) * bits
+        mask = ((payload[:, None] >> shifts) & ((1 << bits) - 1)).ravel()[:numPixels]
+    else:
+        # Pixels straddle byte boundaries, so the bit planes are unpacked and recombined.
+        bitPlanes = np.unpackbits(payload, count = numPixels * bits).reshape(numPixels, bits)
+        mask = np.zeros(numPixels, dtype = np.uint8)
+        for i in range(bits):
+            mask |= bitPlanes[:, i] << (bits - 1 - i)
+
+    return mask.reshape(height, width)
+
+def loadMask(path):
+    # Masks are decoded only when requested, regardless of their storage format.
+    if path.suffix == '.pmk':
+        return decodeMask(path.read_bytes())
+    return np.load(path).astype(np.uint8)
+
+def saveMask(folder, ID, mask):
+    if COMPACT_MASKS:
+        path = folder / f'{ID}.pmk'
+        path.write_bytes(encodeMask(mask))
+    else:
+        path = folder / f'{ID}.npy'
+        np.save(path, mask)
+    return path
+
+def findMask(folder, ID):
+    # Locate the mask of a sample, irrespective of its storage format.
+    for suffix in MASK_SUFFIXES:
+        path = folder / f'{ID}{suffix}'
+        if path.exists():
+            return path
+    raise FileNotFoundError(f'No mask found for {ID} in {folder}.')
+
+def findMasks(folder):
+    # Map sample names to mask paths, giving precedence to compact masks.
+    maskPaths = {}
+    for suffix in reversed(MASK_SUFFIXES):
+        for path in folder.glob(f'*{suffix}'):
+            maskPaths[path.stem] = path
+    return maskPaths
\ No newline at end of file
@@ -1,6 +1,6 @@
 import numpy as np
 from MyDataset import MyDataset
-from computeMetrics import computeMetrics
+from MetricAccumulator import MetricAccumulator
 from torch import from_numpy
 from matplotlib.pyplot import subplots, savefig, close
 from matplotlib.lines import Line2D
@@ -112,17 +112,17 @@ class ModelTester:
 
     def runInference(self):
         # Run the model on the testing set.
-        aggregatedMetrics = {'Dice Coefficient': 0.0, 'IoU': 0.0, 'Accuracy': 0.0, 'Precision': 0.0, 'Recall': 0.0}
+        # Metrics are computed over all pixels of the testing set, rather than averaged over images.
+        metricAccumulator = MetricAccumulator('cpu')
         for i in range(len(self.dataset)):
             image, groundTruth = self.dataset[i]
             imageInput = np.expand_dims(image.numpy().astype(np.float32), axis = 0)
             output = self.session.run(None, {self.session.get_inputs()[0].name: imageInput})[0]
-            metrics = computeMetrics(from_numpy(output), groundTruth.unsqueeze(axis = 0))
-            aggregatedMetrics = {key: value + metrics[key] for key, value in aggregatedMetrics.items()}
+            metricAccumulator.update(from_numpy(output), groundTruth.unsqueeze(axis = 0))
             self.plotResults(image, np.argmax(output, axis = 1).squeeze(), groundTruth, i)
 
-        averagedMetrics = {key: value / len(self.dataset) for key, value in aggregatedMetrics.items()}
-        print('\n'.join(f'{key}: {value:.4f}' for key, value in averagedMetrics.items()))
+        metrics = metricAccumulator.compute()
+        print('\n'.join(f'{key}: {value:.4f}' for key, value in metrics.items()))
 
 modelPath = MODEL_PATH / 'bestModel.onnx'
 device = setupDevice()
@@ -0,0 +1,36 @@
+from trainingInitialization import getDataloaders
+from configurationFile import LOADER_SETTINGS, PROFILING_PATH
+
+class DataService:
+    # Data loading shared by all trials of a study. Datasets are indexed and worker processes are spawned only once.
+    # Workers are persistent, so they keep their memory maps, caches and warm page cache from one trial to the next.
+    def __init__(self, loaderSettings = LOADER_SETTINGS, profilingPath = PROFILING_PATH):
+        self.loaderSettings = dict(loaderSettings, persistentWorkers = True)
+        self.trainingDataloader, self.validationDataloader = getDataloaders(self.loaderSettings, profilingPath)
+        self.attachedTrial = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def attach(self, trialNumber):
+        # Trials run one at a time, since they would otherwise draw batches from the same worker queues.
+        if self.attachedTrial is not None:
+            raise RuntimeError(f'Data service is already attached to trial {self.attachedTrial}.')
+        self.attachedTrial = trialNumber
+        return self.trainingDataloader, self.validationDataloader
+
+    def detach(self):
+        # Workers remain alive. Batches left over by an interrupted epoch are discarded once the next epoch starts.
+        self.attachedTrial = None
+
+    def close(self):
+        # Persistent workers are otherwise only shut down when the DataLoader objects are garbage-collected.
+        for dataloader in [self.trainingDataloader, self.validationDataloader]:
+            iterator = getattr(dataloader, '_iterator', None)
+            if iterator is not None and hasattr(iterator, '_shutdown_workers'):
+                iterator._shutdown_workers()
+            dataloader._iterator = None
+        print('Data service closed.')
\ No newline at end of file
@@ -0,0 +1,37 @@
+from torch import zeros, ones_like, where
+from torch.nn import Module
+from torch.nn.functional import log_softmax, nll_loss
+from configurationFile import NUM_CLASSES
+
+class FusedLossFunction(Module):
+    # Composite loss of LossFunction.py, with both terms derived from a single log-softmax pass over the logits.
+    # Dice term is computed on soft probabilities, so that it contributes a gradient rather than only a value.
+    def __init__(self, alpha = 0.5, epsilon = 1e-6):
+        super().__init__()
+        self.alpha = alpha
+        self.epsilon = epsilon
+
+    def diceLoss(self, probabilities, groundTruth):
+        # Generalized Dice [https://doi.org/10.1007/978-3-319-67558-9_28], with class sums gathered by index instead of a one-hot tensor.
+        batchSize = groundTruth.shape[0]
+        # Inputs may be non-contiguous, e.g. channels-last logits or resized targets, so they are reshaped rather than viewed.
+        indices = groundTruth.reshape(batchSize, -1)
+        targetProbabilities = probabilities.gather(1, groundTruth.unsqueeze(1)).reshape(batchSize, -1)
+        intersection = zeros(batchSize, NUM_CLASSES, device = probabilities.device).scatter_add_(1, indices, targetProbabilities)
+        targetCounts = zeros(batchSize, NUM_CLASSES, device = probabilities.device).scatter_add_(1, indices, ones_like(targetProbabilities))
+        predictedSums = probabilities.sum(dim = (2, 3))
+
+        # Classes are weighted by their inverse squared area. Absent classes receive the largest weight of the sample.
+        weights = targetCounts.clamp(min = 1).pow(-2)
+        presentClasses = targetCounts > 0
+        weights = where(presentClasses, weights, (weights * presentClasses).amax(dim = 1, keepdim = True))
+        numerator = 2 * (weights * intersection).sum(dim = 1)
+        denominator = (weights * (predictedSums + targetCounts)).sum(dim = 1)
+        return 1 - (numerator / denominator.clamp(min = self.epsilon)).mean()
+
+    def forward(self, prediction, groundTruth):
+        # Loss is always computed in float32, since the logarithms and sums lose accuracy in reduced precision.
+        logProbabilities = log_softmax(prediction.float(), dim = 1)
+        crossEntropyLoss = nll_loss(logProbabilities, groundTruth)
+        diceLoss = self.diceLoss(logProbabilities.exp(), groundTruth)
+        return self.alpha * crossEntropyLoss + (1 - self.alpha) * diceLoss
\ No newline at end of file
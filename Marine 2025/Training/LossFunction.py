@@ -16,6 +16,8 @@ class LossFunction(Module):
         return 1 - diceScore.mean()
 
     def forward(self, prediction, groundTruth):
+        # Loss is always computed in float32, since the logarithms and sums lose accuracy in reduced precision.
+        prediction = prediction.float()
         crossEntropyLoss = self.crossEntropyLoss(prediction, groundTruth)
         diceLoss = self.diceLoss(prediction, groundTruth)
         return self.alpha * crossEntropyLoss + (1 - self.alpha) * diceLoss
\ No newline at end of file
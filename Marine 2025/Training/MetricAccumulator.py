@@ -0,0 +1,39 @@
+from torch import zeros, bincount, int64, float64
+from configurationFile import NUM_CLASSES
+
+class MetricAccumulator:
+    # Accumulates a confusion matrix over a whole epoch, from which all metrics are derived exactly at the end.
+    # Updates stay on the device, so the host only synchronizes once per epoch instead of after every batch.
+    def __init__(self, device, numClasses = NUM_CLASSES):
+        self.numClasses = numClasses
+        # Rows hold ground truth classes and columns hold predicted classes.
+        self.confusionMatrix = zeros((numClasses, numClasses), dtype = int64, device = device)
+        self.lossSum = zeros((), dtype = float64, device = device)
+        self.numSamples = 0
+
+    def update(self, prediction, groundTruth, loss = None):
+        # Predictions may be given either as logits of shape (B, C, H, W) or as class indices of shape (B, H, W).
+        if prediction.dim() == groundTruth.dim() + 1:
+            prediction = prediction.argmax(dim = 1)
+        indices = groundTruth.flatten() * self.numClasses + prediction.flatten()
+        self.confusionMatrix += bincount(indices, minlength = self.numClasses**2).view(self.numClasses, self.numClasses)
+        # Loss is weighted by the batch size, since the last batch of an epoch may be smaller.
+        if loss is not None:
+            self.lossSum += loss.detach().double() * groundTruth.shape[0]
+            self.numSamples += groundTruth.shape[0]
+
+    def compute(self):
+        matrix = self.confusionMatrix.double().cpu()
+        truePositives = matrix.diagonal()
+        predicted = matrix.sum(dim = 0)
+        actual = matrix.sum(dim = 1)
+        # Per-class metrics are averaged over the classes that occur in either the predictions or the ground truth.
+        present = (predicted + actual) > 0
+        metrics = {'Loss': self.lossSum.item() / self.numSamples} if self.numSamples else {}
+        metrics['Dice Coefficient'] = (2 * truePositives / (predicted + actual).clamp(min = 1))[present].mean().item()
+        metrics['IoU'] = (truePositives / (predicted + actual - truePositives).clamp(min = 1))[present].mean().item()
+        # Macro accuracy averages the per-class accuracies, as multiclass_accuracy with average = 'macro' did, rather than counting pixels.
+        metrics['Accuracy'] = (truePositives / actual.clamp(min = 1))[present].mean().item()
+        metrics['Precision'] = (truePositives / predicted.clamp(min = 1))[present].mean().item()
+        metrics['Recall'] = (truePositives / actual.clamp(min = 1))[present].mean().item()
+        return metrics
\ No newline at end of file
@@ -0,0 +1,101 @@
+from json import load, dump, dumps
+from hashlib import sha1
+from os import cpu_count
+from platform import node
+from time import perf_counter
+from torch import __version__ as torchVersion, get_num_threads
+from trainingPreparation import prepareBatch
+from trainingInitialization import getDataloaders, getOptimizer, initializeModel, initializeLossFunction, applyLoaderSettings
+from configurationFile import NUM_CLASSES, LOADER_SETTINGS, AUTOTUNE_DATALOADERS, AUTOTUNING_PATH, BATCH_SIZE, RESOLUTION
+from configurationFile import PACKED_DATASET, DRAFT_DECODING, SHARDED_DATASET, TILED_DATASET, BATCH_AUGMENTATION, UINT8_TRANSFER, VALIDATION_CACHE
+
+def measureStepTime(loaderSettings, model, criterion, optimizer, device, numSteps):
+    # End-to-end training step time, including data loading, averaged over two short passes.
+    # Two passes expose the cost of respawning non-persistent workers.
+    applyLoaderSettings(loaderSettings)
+    trainingDataloader, _ = getDataloaders(loaderSettings)
+    numSteps = min(numSteps, len(trainingDataloader))
+    model.train()
+    elapsedTime = 0
+
+    for _ in range(2):
+        start = perf_counter()
+        for step, data in enumerate(trainingDataloader):
+            if step == numSteps:
+                break
+            image, groundTruth = prepareBatch(data, device)
+            optimizer.zero_grad()
+            loss = criterion(model(image), groundTruth)
+            loss.backward()
+            optimizer.step()
+        elapsedTime += perf_counter() - start
+
+    return elapsedTime / (2 * numSteps)
+
+def candidateWorkers(numCores):
+    # At least one core is left to the main process, which runs the model.
+    return sorted({numWorkers for numWorkers in [2, 4, 8, numCores // 4, numCores // 2] if 0 < numWorkers < numCores}) or [1]
+
+def autotuneDataloaders(device, numSteps = 10):
+    # Coordinate search, since an exhaustive grid would take too long on CPU-only nodes:
+    # 1) Workers and intra-op threads are tuned jointly, since they compete for the same cores.
+    # 2) Prefetch depth and worker persistence are then tuned in turn.
+    numCores = cpu_count()
+    model = initializeModel(inChannels = 3, numClasses = NUM_CLASSES, device = device)
+    criterion = initializeLossFunction()
+    optimizer, _, _ = getOptimizer(model.parameters(), 1e-4)
+    defaultThreads = get_num_threads()
+    measuredTimes = {}
+
+    def evaluate(loaderSettings):
+        key = tuple(loaderSettings.values())
+        if key not in measuredTimes:
+            measuredTimes[key] = measureStepTime(loaderSettings, model, criterion, optimizer, device, numSteps)
+            print(f'Loader settings {loaderSettings}: {measuredTimes[key]:.3f} s/step.')
+        return measuredTimes[key]
+
+    candidates = []
+    for numWorkers in candidateWorkers(numCores):
+        for numThreads in sorted({max(1, numCores - numWorkers), max(1, (numCores - numWorkers) // 2)}):
+            candidates.append({'numWorkers': numWorkers, 'prefetchFactor': 2, 'persistentWorkers': True, 'numThreads': numThreads})
+    bestSettings = min(candidates, key = evaluate)
+
+    for prefetchFactor in [2, 4, 8]:
+        candidate = {**bestSettings, 'prefetchFactor': prefetchFactor}
+        if evaluate(candidate) < evaluate(bestSettings):
+            bestSettings = candidate
+    candidate = {**bestSettings, 'persistentWorkers': not bestSettings['persistentWorkers']}
+    if evaluate(candidate) < evaluate(bestSettings):
+        bestSettings = candidate
+
+    applyLoaderSettings({'numThreads': defaultThreads})
+    return bestSettings, evaluate(bestSettings)
+
+def pipelineKey():
+    # Fastest settings depend on the data pipeline as much as on the machine, so the options shaping it are part of the cache key.
+    options = {'packed': PACKED_DATASET, 'draft': DRAFT_DECODING, 'sharded': SHARDED_DATASET, 'tiled': TILED_DATASET,
+               'batchAugmentation': BATCH_AUGMENTATION, 'uint8': UINT8_TRANSFER, 'validationCache': VALIDATION_CACHE,
+               'batchSize': BATCH_SIZE, 'resolution': RESOLUTION}
+    return sha1(dumps(options, sort_keys = True).encode()).hexdigest()[:8]
+
+def getLoaderSettings(device):
+    # Tuned settings are cached per machine and pipeline, so that only the first run pays for the search.
+    if not AUTOTUNE_DATALOADERS:
+        applyLoaderSettings(LOADER_SETTINGS)
+        return LOADER_SETTINGS
+
+    cachePath = AUTOTUNING_PATH / f'{node()}-{cpu_count()}cores-{device}-torch{torchVersion}-pipeline{pipelineKey()}.json'
+    if cachePath.exists():
+        with open(cachePath, 'r') as f:
+            loaderSettings = load(f)['loaderSettings']
+        print(f'Loaded tuned loader settings from {cachePath}.')
+    else:
+        loaderSettings, stepTime = autotuneDataloaders(device)
+        AUTOTUNING_PATH.mkdir(parents = True, exist_ok = True)
+        with open(cachePath, 'w') as f:
+            dump({'loaderSettings': loaderSettings, 'stepTime': stepTime}, f, indent = 4)
+        print(f'Tuned loader settings saved to {cachePath}.')
+
+    applyLoaderSettings(loaderSettings)
+    print(f'Loader settings: {loaderSettings}')
+    return loaderSettings
\ No newline at end of file
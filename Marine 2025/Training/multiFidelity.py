@@ -0,0 +1,104 @@
+import numpy as np
+from os import cpu_count
+from json import dump
+from concurrent.futures import ThreadPoolExecutor
+from iterstrat.ml_stratifiers import MultilabelStratifiedShuffleSplit
+from torch.nn.functional import interpolate
+from MyTileDataset import MyTileDataset
+from MyIterableDataset import MyIterableDataset
+from maskCodec import loadMask
+from configurationFile import SEED, NUM_CLASSES, FIDELITY_LEVELS, MIN_RESOURCE, REDUCTION_FACTOR, MODEL_PATH
+# Core pinning is only available on Linux.
+try:
+    from os import sched_getaffinity
+except ImportError:
+    sched_getaffinity = None
+
+def classPresence(dataset):
+    # Binary matrix of the classes present in every training sample, used for stratification.
+    if isinstance(dataset, MyTileDataset):
+        return dataset.histograms > 0
+    # Class pixel counts of the index written by ClassLocationIndex.py already describe every mask.
+    indexPath = dataset.maskFolder / 'ClassLocations.npz'
+    if indexPath.exists():
+        index = np.load(indexPath)
+        rows = {name: row for row, name in enumerate(index['names'])}
+        names = [dataset.sampleName(i) for i in range(len(dataset))]
+        if all(name in rows for name in names):
+            return index['classCounts'][[rows[name] for name in names]].reshape(len(dataset), NUM_CLASSES) > 0
+        print(f'Class location index {indexPath} does not cover every sample. Decoding the masks instead.')
+
+    def sampleClasses(index):
+        mask = dataset.packedStore[index][1] if dataset.packedFlag else loadMask(dataset.dataset[index][1])
+        return np.bincount(mask.ravel(), minlength = NUM_CLASSES)[:NUM_CLASSES] > 0
+
+    with ThreadPoolExecutor(max_workers = allocatedCores()) as executor:
+        return np.array(list(executor.map(sampleClasses, range(len(dataset))))).reshape(len(dataset), NUM_CLASSES)
+
+def stratifiedSubset(labels, fraction):
+    # Subset preserves the class distribution of the training split, as in SubsetSplit.py.
+    if fraction >= 1:
+        return None
+    stratifier = MultilabelStratifiedShuffleSplit(n_splits = 1, train_size = fraction, random_state = SEED)
+    indices, _ = next(stratifier.split(np.zeros((len(labels), 1)), labels))
+    return sorted(indices.tolist())
+
+def getFidelitySchedule(dataset):
+    # Rungs end after MIN_RESOURCE * REDUCTION_FACTOR^i epochs, matching the rungs of the Hyperband pruner.
+    # Trials promoted past the last rung of FIDELITY_LEVELS train at full fidelity.
+    if isinstance(dataset, MyIterableDataset):
+        print('Streamed datasets cannot be subsampled. Early rungs will only train at reduced resolution.')
+        labels = None
+    else:
+        labels = classPresence(dataset)
+
+    schedule = []
+    for level, (scale, fraction) in enumerate(FIDELITY_LEVELS):
+        indices = stratifiedSubset(labels, fraction) if labels is not None else None
+        schedule.append({'untilEpoch': MIN_RESOURCE * REDUCTION_FACTOR**level, 'scale': scale, 'fraction': fraction if indices else 1.0,
+                         'indices': indices})
+    return schedule
+
+def fidelityAt(schedule, epoch):
+    # Fidelity level of an epoch, counted from one. Full fidelity is level len(schedule).
+    for level, rung in enumerate(schedule or []):
+        if epoch <= rung['untilEpoch']:
+            return level, rung
+    return len(schedule or []), {'scale': 1.0, 'fraction': 1.0, 'indices': None}
+
+def resizeBatch(image, groundTruth, scale):
+    # Reduced resolution is obtained on the device, so the same DataLoader serves every fidelity level.
+    if scale == 1:
+        return image, groundTruth
+    image = interpolate(image, scale_factor = scale, mode = 'bilinear', antialias = True)
+    groundTruth = interpolate(groundTruth.unsqueeze(1).float(), scale_factor = scale, mode = 'nearest-exact').squeeze(1).long()
+    return image, groundTruth
+
+def allocatedCores():
+    return len(sched_getaffinity(0)) if sched_getaffinity is not None else cpu_count()
+
+def reportFidelitySavings(study):
+    # Every epoch of reduced fidelity is compared against the median cost of a full-fidelity epoch in the same study.
+    # CPU-hours are wall time multiplied by the cores allocated to the trial process, which includes its DataLoader workers.
+    # Resumed trials carry over the costs of the trials they replace, which are therefore skipped.
+    # Every trial of a chain of resumptions records the trial it directly replaces, so that the whole chain is skipped.
+    trials = study.get_trials(deepcopy = False)
+    replacedTrials = {trial.user_attrs['replaces'] for trial in trials if 'replaces' in trial.user_attrs}
+    epochCosts = [cost for trial in trials if trial.number not in replacedTrials for cost in trial.user_attrs.get('epochCosts', [])]
+    fullCosts = [seconds for scale, fraction, seconds, _ in epochCosts if scale == 1 and fraction == 1]
+    if not fullCosts:
+        print('No full-fidelity epochs were recorded, so savings cannot be estimated.')
+        return None
+
+    fullEpochSeconds = float(np.median(fullCosts))
+    actualHours = sum(seconds * cores for _, _, seconds, cores in epochCosts) / 3600
+    fullFidelityHours = sum(fullEpochSeconds * cores for _, _, _, cores in epochCosts) / 3600
+    report = {'epochs': len(epochCosts), 'reducedFidelityEpochs': len(epochCosts) - len(fullCosts),
+              'fullFidelityEpochSeconds': round(fullEpochSeconds, 2), 'actualCPUHours': round(actualHours, 2),
+              'fullFidelityCPUHours': round(fullFidelityHours, 2), 'savedCPUHours': round(fullFidelityHours - actualHours, 2)}
+    path = MODEL_PATH / 'fidelityReport.json'
+    with open(path, 'w') as f:
+        dump(report, f, indent = 4)
+    print(f'Multi-fidelity search used {actualHours:.1f} CPU-hours, saving {report["savedCPUHours"]:.1f} CPU-hours '
+          f'over training every epoch at full fidelity. Report saved at {path}.')
+    return report
\ No newline at end of file
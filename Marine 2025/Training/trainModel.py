@@ -1,44 +1,183 @@
-from optuna import create_study
+from os import cpu_count
+from argparse import ArgumentParser
+from datetime import datetime
+from multiprocessing import get_context
+from optuna import create_study, load_study, get_all_study_summaries
 from optuna.samplers import TPESampler
-from optuna.pruners import MedianPruner
-from trainingInitialization import getDataloaders, getOptimizer, initializeModel, setupDevice, initializeLossFunction, setSeed
+from optuna.pruners import MedianPruner, HyperbandPruner
+from optuna.storages import JournalStorage
+from optuna.storages.journal import JournalFileBackend
+from optuna.trial import TrialState
+from optuna.study import MaxTrialsCallback
+from trainingInitialization import getOptimizer, initializeModel, setupDevice, initializeLossFunction, setSeed, compileModel, applyLoaderSettings
+from trainingInitialization import getTrainingDataset, getValidationDataset
 from trainingPreparation import trainingLoop
-from trainingFinalization import saveONNX, saveResults, deleteResiduals
-from configurationFile import SEED, RESOLUTION, NUM_CLASSES, MODEL_PATH
-
-def trainModel(savePath, device, numClasses, numTrials):
-    # Ensure reproducibility between runs.
-    setSeed(SEED)
-    # List to keep track of all the saved files for each trial.
-    savedFiles = []
-    # Initiate hyperparameter optimization with respect to validation loss.
+from autotuneDataloaders import getLoaderSettings
+from DataService import DataService
+from StageProfiler import clearProfiles
+from initializeWeights import initializeWeights
+from multiFidelity import getFidelitySchedule, reportFidelitySavings
+from trainingFinalization import saveONNX, saveResults, deleteResiduals, getCheckpointPath
+from configurationFile import SEED, RESOLUTION, NUM_CLASSES, MODEL_PATH, PROFILE_PIPELINE, PROFILING_PATH, COMPILE_MODEL, STUDY_STORAGE_PATH
+from configurationFile import LOADER_SETTINGS, MULTI_FIDELITY, MIN_RESOURCE, REDUCTION_FACTOR, VALIDATION_CACHE
+# Core pinning is only available on Linux.
+try:
+    from os import sched_getaffinity, sched_setaffinity
+except ImportError:
+    sched_getaffinity, sched_setaffinity = None, None
+
+def getStorage():
+    # Study is persisted in a journal file, which is appended to after every trial update and survives crashes.
+    # Journal file also serves as the shared store of parallel trial workers, since appends are synchronized through file locks.
+    STUDY_STORAGE_PATH.parent.mkdir(parents = True, exist_ok = True)
+    return JournalStorage(JournalFileBackend(str(STUDY_STORAGE_PATH)))
+
+def getSampler(workerIndex = 0, parallelFlag = False):
     # Use Tree-structured Parzen Estimator (TPE) to exploe hyperparameter space.
-    study = create_study(direction = 'minimize', sampler = TPESampler(seed = SEED), 
-                         pruner = MedianPruner(n_startup_trials = 10, n_warmup_steps = 30))
+    # Parallel workers are seeded differently, so that they do not sample identical hyperparameters.
+    # Constant liar treats running trials as if they had performed poorly, which keeps workers from crowding the same region.
+    return TPESampler(seed = SEED + workerIndex, constant_liar = parallelFlag)
+
+def getPruner():
+    # Multi-fidelity search relies on successive halving, whose rungs coincide with the fidelity levels.
+    if MULTI_FIDELITY:
+        return HyperbandPruner(min_resource = MIN_RESOURCE, reduction_factor = REDUCTION_FACTOR)
+    return MedianPruner(n_startup_trials = 10, n_warmup_steps = 30)
+
+def getStudy(resumeFlag):
+    storage = getStorage()
+    summaries = get_all_study_summaries(storage) if resumeFlag else []
+    if not summaries:
+        if resumeFlag:
+            print('No study found to resume. Starting a new study.')
+        studyName = f'Study {datetime.now():%Y-%m-%d %H-%M-%S}'
+        return create_study(study_name = studyName, storage = storage, direction = 'minimize', sampler = getSampler(), pruner = getPruner())
+
+    # Most recent study is resumed. Trials left running by the crash are failed and enqueued again with the same hyperparameters.
+    # Re-enqueued trials continue from the latest checkpoint along the chain of trials they replace.
+    # This is the checkpoint of the interrupted trial if it saved one, and otherwise the one it had resumed from itself.
+    study = load_study(study_name = summaries[-1].study_name, storage = storage, sampler = getSampler(), pruner = getPruner())
+    for trial in study.get_trials(deepcopy = False, states = (TrialState.RUNNING,)):
+        study.tell(trial.number, state = TrialState.FAIL)
+        resumeFrom = trial.number if getCheckpointPath(study.study_name, trial.number).exists() else trial.user_attrs.get('resumeFrom', trial.number)
+        study.enqueue_trial(trial.params, user_attrs = {'resumeFrom': resumeFrom, 'replaces': trial.number})
+        print(f'Trial {trial.number} was interrupted and will be resumed.')
+    print(f'Resuming {study.study_name}.')
+    return study
+
+def getSavedFiles(study):
+    # Saved files of every completed trial, irrespective of the process or run that completed it.
+    completedTrials = study.get_trials(deepcopy = False, states = (TrialState.COMPLETE,))
+    return [(MODEL_PATH / f'modelTrial{trial.number}.onnx', MODEL_PATH / f'resultsTrial{trial.number}.json',
+             MODEL_PATH / f'trainingPlot{trial.number}.png') for trial in completedTrials]
+
+def runTrials(study, device, numClasses, numTrials, loaderSettings, fidelitySchedule = None, profilingPath = PROFILING_PATH):
+    # Data loading is started once and shared by every trial of the study.
+    dataService = DataService(loaderSettings, profilingPath)
+    # Compiled model is created once per study, since the architecture is identical in all trials.
+    studyModel = initializeModel(inChannels = 3, numClasses = numClasses, device = device) if COMPILE_MODEL else None
+    compiledModel = compileModel(studyModel) if COMPILE_MODEL else None
 
     def objective(trial):
         learningRate = trial.suggest_float('learningRate', 1e-5, 1e-3, log = True)
         criterion = initializeLossFunction()
-        model = initializeModel(inChannels = 3, numClasses = numClasses, device = device)
+        if COMPILE_MODEL:
+            # Weights and batch normalization statistics are reset in place, which keeps the compiled graphs valid.
+            model = studyModel
+            model.apply(initializeWeights)
+            trainingModel = compiledModel
+        else:
+            model = initializeModel(inChannels = 3, numClasses = numClasses, device = device)
+            trainingModel = model
         optimizer, warmupScheduler, mainScheduler = getOptimizer(model.parameters(), learningRate)
-        trainingDataloader, validationDataloader = getDataloaders()
-        trainingMetrics, validationMetrics, PNGPath, maxEpochs = trainingLoop(model, trial, trainingDataloader, validationDataloader, optimizer,
-                                                                              warmupScheduler, mainScheduler, criterion, device)
+        trainingDataloader, validationDataloader = dataService.attach(trial.number)
+        try:
+            trainingMetrics, validationMetrics, PNGPath, maxEpochs = trainingLoop(trainingModel, trial, trainingDataloader, validationDataloader,
+                                                                                  optimizer, warmupScheduler, mainScheduler, criterion, device,
+                                                                                  fidelitySchedule = fidelitySchedule, profilingPath = profilingPath)
+        finally:
+            dataService.detach()
         inputShape = (1, 3, *RESOLUTION)
-        # Save valuable trial results separately.
-        ONNXPath = saveONNX(model, device, inputShape, MODEL_PATH, trial.number)
-        JSONPath = saveResults(trial, maxEpochs, trainingMetrics, validationMetrics, MODEL_PATH)
-        savedFiles.append((ONNXPath, JSONPath, PNGPath))
+        # Save valuable trial results separately. Export always traces the eager module.
+        saveONNX(model, device, inputShape, MODEL_PATH, trial.number)
+        saveResults(trial, maxEpochs, trainingMetrics, validationMetrics, MODEL_PATH)
         return validationMetrics['Loss']
 
-    # Obtain optimal trial.
-    study.optimize(objective, n_trials = numTrials)
+    # Only the remaining trials are run, with interrupted ones not counting towards the total.
+    # Total is checked against the shared study after every trial, so that parallel workers stop together.
+    finishedStates = (TrialState.COMPLETE, TrialState.PRUNED)
+    remainingTrials = numTrials - len(study.get_trials(deepcopy = False, states = finishedStates))
+    with dataService:
+        if remainingTrials > 0:
+            study.optimize(objective, n_trials = remainingTrials, callbacks = [MaxTrialsCallback(numTrials, states = finishedStates)])
+
+def workerCores(workerIndex, numWorkers):
+    # Available cores are split into contiguous, disjoint sets of equal size, one per trial worker.
+    cores = sorted(sched_getaffinity(0)) if sched_getaffinity is not None else list(range(cpu_count()))
+    return cores[workerIndex * len(cores) // numWorkers:(workerIndex + 1) * len(cores) // numWorkers]
+
+def trialWorker(workerIndex, numWorkers, studyName, device, numClasses, numTrials, fidelitySchedule):
+    # Worker process, which runs trials of the shared study on its own set of cores.
+    # DataLoader workers inherit the core set, which is divided between them and the intra-op threads of the trials.
+    cores = workerCores(workerIndex, numWorkers)
+    if sched_setaffinity is not None:
+        sched_setaffinity(0, cores)
+    numLoaderWorkers = max(1, len(cores) // 2)
+    loaderSettings = {**LOADER_SETTINGS, 'numWorkers': numLoaderWorkers, 'numThreads': max(1, len(cores) - numLoaderWorkers)}
+    applyLoaderSettings(loaderSettings)
+    setSeed(SEED + workerIndex)
+    study = load_study(study_name = studyName, storage = getStorage(), sampler = getSampler(workerIndex, parallelFlag = True), pruner = getPruner())
+    print(f'Trial worker {workerIndex} started on cores {cores} with loader settings {loaderSettings}.')
+    # Stage timings of each worker are kept in a folder of its own, so that every profile only covers the loaders of its trial.
+    runTrials(study, device, numClasses, numTrials, loaderSettings, fidelitySchedule, PROFILING_PATH / f'Worker {workerIndex}')
+
+def trainModel(savePath, device, numClasses, numTrials, resumeFlag = False, numWorkers = 1):
+    # Initiate hyperparameter optimization with respect to validation loss.
+    study = getStudy(resumeFlag)
+    # Stage timings of previous studies are discarded before any worker starts writing.
+    if PROFILE_PIPELINE:
+        clearProfiles(PROFILING_PATH)
+    # Stratified subsets of the early rungs are selected once by this process, and shared by every trial and worker.
+    fidelitySchedule = getFidelitySchedule(getTrainingDataset()) if MULTI_FIDELITY else None
+
+    if numWorkers == 1:
+        # Loader settings are fixed once per study, before seeding, so that autotuning does not consume random numbers.
+        loaderSettings = getLoaderSettings(device)
+        # Ensure reproducibility between runs.
+        setSeed(SEED)
+        runTrials(study, device, numClasses, numTrials, loaderSettings, fidelitySchedule)
+    else:
+        # Validation cache is built by this process before any worker starts, so that workers find it complete rather than racing to write it.
+        if VALIDATION_CACHE:
+            getValidationDataset()
+        # Trial workers are spawned rather than forked, so that none of them inherits thread pools or CUDA state of this process.
+        context = get_context('spawn')
+        workers = [context.Process(target = trialWorker, args = (workerIndex, numWorkers, study.study_name, device, numClasses, numTrials,
+                                                                     fidelitySchedule))
+                   for workerIndex in range(numWorkers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        # Crashed workers, e.g. out of memory, leave their trials running in the study, which --resume continues.
+        failedWorkers = [workerIndex for workerIndex, worker in enumerate(workers) if worker.exitcode != 0]
+        if failedWorkers:
+            print(f'Trial workers {failedWorkers} exited with codes {[workers[i].exitcode for i in failedWorkers]}. Skipping clean up.')
+            raise RuntimeError('Trial workers failed. Run trainModel.py --resume to complete the study.')
+
+    # Obtain optimal trial. Only this process cleans up, once every worker has finished.
     bestTrial = study.best_trial
     # Clean up non-optimal saved files.
-    deleteResiduals(savedFiles, bestTrial.number, savePath)
+    deleteResiduals(getSavedFiles(study), bestTrial.number, savePath)
+    if MULTI_FIDELITY:
+        reportFidelitySavings(study)
 
 if __name__ == '__main__':
     # Multiprocessing guard.
+    parser = ArgumentParser(description = 'Optimize the hyperparameters of the U-Net.')
+    parser.add_argument('--resume', action = 'store_true', help = 'Continue the most recent study, including its interrupted trial.')
+    parser.add_argument('--workers', type = int, default = 1, help = 'Number of trials run in parallel, each on its own set of cores.')
+    arguments = parser.parse_args()
     device = setupDevice()
     numTrials = 50
-    trainModel(MODEL_PATH, device, NUM_CLASSES, numTrials)
+    trainModel(MODEL_PATH, device, NUM_CLASSES, numTrials, arguments.resume, arguments.workers)
@@ -1,32 +1,77 @@
-from os import rename, remove
-from torch import randn
+from os import replace
+from random import getstate, setstate
+from numpy.random import get_state, set_state
+from torch import randn, channels_last, save, load as loadTensors, get_rng_state, set_rng_state
+from torch.cuda import is_available, get_rng_state_all, set_rng_state_all
 from torch.onnx import export
 from json import dump, load
-from configurationFile import MODEL_PATH
+from fileLock import fileLock
+from configurationFile import MODEL_PATH, MIXED_PRECISION, CHANNELS_LAST, CHECKPOINT_PATH
+
+def updateLog(logPath, epoch, logEntry, trialNumber):
+    # Logs are JSON files with one entry per trial and epoch.
+    # Parallel trial workers update the same logs, so each read-modify-write cycle is guarded by an exclusive lock.
+    with fileLock(logPath):
+        if logPath.exists():
+            with open(logPath, 'r') as file:
+                studyData = load(file)
+        else:
+            studyData = {}
+
+        trialKey = f'Trial {trialNumber}'
+        epochKey = f'Epoch {epoch}'
+        if trialKey not in studyData:
+            studyData[trialKey] = {}
+        studyData[trialKey][epochKey] = logEntry
+        with open(logPath, 'w') as file:
+            dump(studyData, file, indent = 4)
 
 def saveTrialData(epoch, currentLR, trainingMetrics, validationMetrics, trialNumber):
     # Store all trial data in a JSON file to facilitate subsequent manipulations.
-    logPath = MODEL_PATH / 'trialLog.json'
-    if logPath.exists():
-        with open(logPath, 'r') as file:
-            studyData = load(file)
-    else:
-        studyData = {}
-    
     logEntry = {'learningRate': round(currentLR, 6), 'trainingMetrics': {key: round(value, 4) for key, value in trainingMetrics.items()},
-                'validationMetrics': {key: round(value, 4) for key, value in validationMetrics.items()}}    
-    trialKey = f'Trial {trialNumber}'
-    epochKey = f'Epoch {epoch}'
-    if trialKey not in studyData:
-        studyData[trialKey] = {}
-    studyData[trialKey][epochKey] = logEntry
-    with open(logPath, 'w') as file:
-        dump(studyData, file, indent = 4)
+                'validationMetrics': {key: round(value, 4) for key, value in validationMetrics.items()}}
+    updateLog(MODEL_PATH / 'trialLog.json', epoch, logEntry, trialNumber)
+
+def saveProfileData(epoch, profile, trialNumber):
+    # Stage timings of the data pipeline are kept apart from the metrics, in the same layout as trialLog.json.
+    updateLog(MODEL_PATH / 'profileLog.json', epoch, profile, trialNumber)
+
+def getRNGStates():
+    # Random states of the main process, which determine the order of map-style training samples, including subsets of SubsetSampler.
+    # Augmentations and streamed shuffling are drawn in the persistent DataLoader workers, which are seeded once when spawned.
+    # A resumed trial therefore continues with the same sample order, but not with identical augmentations.
+    return {'python': getstate(), 'numpy': get_state(), 'torch': get_rng_state(), 'cuda': get_rng_state_all() if is_available() else None}
+
+def setRNGStates(RNGStates):
+    setstate(RNGStates['python'])
+    set_state(RNGStates['numpy'])
+    set_rng_state(RNGStates['torch'])
+    if RNGStates['cuda'] is not None and is_available():
+        set_rng_state_all(RNGStates['cuda'])
+
+def getCheckpointPath(studyName, trialNumber):
+    # Trial numbers restart in every study, so checkpoints are kept apart per study.
+    return CHECKPOINT_PATH / studyName / f'trial{trialNumber}.pt'
+
+def saveCheckpoint(state, path):
+    # Checkpoint is written to a temporary file and renamed, so that a crash during writing never corrupts the previous one.
+    path.parent.mkdir(parents = True, exist_ok = True)
+    temporaryPath = path.with_suffix('.tmp')
+    save(state, temporaryPath)
+    replace(temporaryPath, path)
+
+def loadCheckpoint(path):
+    # Checkpoints contain random states besides tensors, so they are not restricted to weights.
+    # Everything is loaded on the CPU, where random states must reside. Weights are copied to the device upon loading.
+    return loadTensors(path, map_location = 'cpu', weights_only = False)
 
 def saveONNX(model, device, inputShape, savePath, trialNumber):
     # ONNX offers framework interoperability and shared optimization [https://en.wikipedia.org/wiki/Open_Neural_Network_Exchange].
     # Exporting requires dummy input tensor.
     dummyInput = randn(inputShape).to(device)
+    # Memory format does not appear in the ONNX graph, whose input remains NCHW. Dummy input merely matches the layout of the model.
+    if CHANNELS_LAST:
+        dummyInput = dummyInput.contiguous(memory_format = channels_last)
     path = savePath / f'modelTrial{trialNumber}.onnx'
     # Constant folding improves efficiency.
     export(model, dummyInput, path, export_params = True, 
@@ -38,7 +83,7 @@ def saveONNX(model, device, inputShape, savePath, trialNumber):
 def saveResults(trial, maxEpochs, trainingMetrics, validationMetrics, savePath):
     # Fetch performance metrics and hyperparameter values in JSON format for future reference.
     results = {'trialNumber': trial.number, 'maxEpochs': maxEpochs, 'trainingMetrics': trainingMetrics,
-               'validationMetrics': validationMetrics, 'hyperparameters': trial.params}
+               'validationMetrics': validationMetrics, 'hyperparameters': trial.params, 'mixedPrecision': MIXED_PRECISION}
 
     path = savePath / f'resultsTrial{trial.number}.json'
     with open(path, 'w') as f:
@@ -47,18 +92,20 @@ def saveResults(trial, maxEpochs, trainingMetrics, validationMetrics, savePath):
     return path
 
 def deleteResiduals(savedFiles, bestTrialNumber, savePath):
+    # Files of trials cleaned up by a previous run of a resumed study no longer exist, and are skipped.
     bestModelFile = savePath / f'modelTrial{bestTrialNumber}.onnx'
     bestResultsFile = savePath / f'resultsTrial{bestTrialNumber}.json'
     bestPlotFile = savePath / f'trainingPlot{bestTrialNumber}.png'
 
     for ONNXFile, JSONFile, PNGFile in savedFiles:
         if ONNXFile != bestModelFile:
-            remove(ONNXFile)
+            ONNXFile.unlink(missing_ok = True)
         if JSONFile != bestResultsFile:
-            remove(JSONFile)
+            JSONFile.unlink(missing_ok = True)
         if PNGFile != bestPlotFile:
-            remove(PNGFile)
-    
-    rename(bestModelFile, savePath / 'bestModel.onnx')
-    rename(bestResultsFile, savePath / 'bestResults.json')
-    rename(bestPlotFile, savePath / 'bestTrainingPlot.png')
\ No newline at end of file
+            PNGFile.unlink(missing_ok = True)
+
+    # Best files of a previous run are only replaced if a resumed run found a better trial.
+    for bestFile, name in [(bestModelFile, 'bestModel.onnx'), (bestResultsFile, 'bestResults.json'), (bestPlotFile, 'bestTrainingPlot.png')]:
+        if bestFile.exists():
+            replace(bestFile, savePath / name)
\ No newline at end of file
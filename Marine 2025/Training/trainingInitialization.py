@@ -4,22 +4,97 @@ from torch import manual_seed as TorchSeed
 from torch.cuda import manual_seed as CUDASeed
 from torch.backends import cudnn
 from torch.cuda import is_available
-from torch import optim
+from functools import partial
+from torch import optim, set_num_threads, compile, channels_last
 from LossFunction import LossFunction
-from torch.utils.data import DataLoader
+from FusedLossFunction import FusedLossFunction
+from torch.utils.data import DataLoader, default_collate
 from torch.optim.lr_scheduler import ReduceLROnPlateau, LambdaLR
 from MyDataset import MyDataset
+from MyIterableDataset import MyIterableDataset
+from MyTileDataset import MyTileDataset
+from BatchAugmentation import BatchAugmentation
+from SubsetSampler import SubsetSampler
 from UNet import UNet
 from initializeWeights import initializeWeights
 from configurationFile import BATCH_SIZE, WARMUP, TRAINING_PATH, VALIDATION_PATH
+from configurationFile import PACKED_DATASET, DRAFT_DECODING, BATCH_AUGMENTATION, LOADER_SETTINGS, VALIDATION_CACHE, UINT8_TRANSFER, SHARDED_DATASET
+from configurationFile import RARE_CLASS_CROPPING, TILED_DATASET, PROFILE_PIPELINE, FUSED_LOSS, CHECKPOINT_LEVELS, CHANNELS_LAST
+from configurationFile import MULTI_FIDELITY, PROFILING_PATH
 
-def getDataloaders():
+def loaderArguments(loaderSettings):
+    # Translate loader settings into DataLoader arguments.
+    # Page-locked memory only accelerates host-to-GPU copies.
+    arguments = {'num_workers': loaderSettings['numWorkers'], 'pin_memory': is_available()}
+    # Prefetching and persistence are only defined when worker processes are used.
+    if loaderSettings['numWorkers'] > 0:
+        arguments['prefetch_factor'] = loaderSettings['prefetchFactor']
+        arguments['persistent_workers'] = loaderSettings['persistentWorkers']
+    return arguments
+
+def streamingArguments(dataset, arguments):
+    # Streamed datasets are split between workers by shard, so workers in excess of the shards would receive no samples.
+    if isinstance(dataset, MyIterableDataset) and arguments['num_workers'] > len(dataset.shards):
+        print(f'{arguments["num_workers"]} workers requested for {len(dataset.shards)} shards of {dataset.rootPath.name}. '
+              f'Using {len(dataset.shards)} workers instead.')
+        return {**arguments, 'num_workers': len(dataset.shards)}
+    return arguments
+
+def applyLoaderSettings(loaderSettings):
+    # Intra-op threads of the main process share the cores with the DataLoader workers.
+    if loaderSettings['numThreads'] is not None:
+        set_num_threads(loaderSettings['numThreads'])
+
+def collateChannelsLast(batch, collateFunction = None):
+    # Images are laid out as NHWC within the workers, so that the main process receives batches ready for the model.
+    image, groundTruth = (collateFunction or default_collate)(batch)
+    return image.contiguous(memory_format = channels_last), groundTruth
+
+def getTrainingDataset(profilingPath = PROFILING_PATH):
+    # Tiled subsets are trained at native resolution, in which case batched augmentation is not applicable.
+    # Background-only tiles are only skipped during training, so that validation still covers whole images.
+    if TILED_DATASET:
+        return MyTileDataset(TRAINING_PATH, augmentationFlag = True, uint8Flag = UINT8_TRANSFER, skipBackgroundFlag = True)
+    # Sharded subsets are streamed sequentially and shuffled within the dataset itself.
+    if SHARDED_DATASET:
+        return MyIterableDataset(TRAINING_PATH, augmentationFlag = True, shuffleFlag = True, draftFlag = DRAFT_DECODING,
+                                 batchAugmentationFlag = BATCH_AUGMENTATION, uint8Flag = UINT8_TRANSFER)
+    return MyDataset(TRAINING_PATH, augmentationFlag = True, packedFlag = PACKED_DATASET, draftFlag = DRAFT_DECODING,
+                     batchAugmentationFlag = BATCH_AUGMENTATION, uint8Flag = UINT8_TRANSFER, rareClassFlag = RARE_CLASS_CROPPING,
+                     profileFlag = PROFILE_PIPELINE, profilingPath = profilingPath)
+
+def getValidationDataset(profilingPath = PROFILING_PATH):
+    # Models trained on tiles are also validated on tiles, at the same scale.
+    if TILED_DATASET:
+        return MyTileDataset(VALIDATION_PATH, augmentationFlag = False, uint8Flag = UINT8_TRANSFER)
+    # Cached validation samples are already read without decoding, so streaming would offer no benefit.
+    if SHARDED_DATASET and not VALIDATION_CACHE:
+        return MyIterableDataset(VALIDATION_PATH, augmentationFlag = False, shuffleFlag = False, draftFlag = DRAFT_DECODING,
+                                 uint8Flag = UINT8_TRANSFER)
+    return MyDataset(VALIDATION_PATH, augmentationFlag = False, packedFlag = PACKED_DATASET, draftFlag = DRAFT_DECODING,
+                     cacheFlag = VALIDATION_CACHE, uint8Flag = UINT8_TRANSFER, profileFlag = PROFILE_PIPELINE, profilingPath = profilingPath)
+
+def getDataloaders(loaderSettings = LOADER_SETTINGS, profilingPath = PROFILING_PATH):
     # Only the training subset is to be augmented.
-    trainingDataset = MyDataset(TRAINING_PATH, augmentationFlag = True)
-    validationDataset = MyDataset(VALIDATION_PATH, augmentationFlag = False)
-    trainingDataloader = DataLoader(dataset = trainingDataset, batch_size = BATCH_SIZE, shuffle = True, pin_memory = True, num_workers = 4)
+    # Stage timings are written to profilingPath, which parallel trial workers keep apart.
+    trainingDataset = getTrainingDataset(profilingPath)
+    validationDataset = getValidationDataset(profilingPath)
+    # Batched augmentation takes place in the collate function, after the samples of each batch have been assembled.
+    collateFunction = BatchAugmentation() if BATCH_AUGMENTATION and not TILED_DATASET else None
+    validationCollateFunction = None
+    if CHANNELS_LAST:
+        collateFunction = partial(collateChannelsLast, collateFunction = collateFunction)
+        validationCollateFunction = collateChannelsLast
+    arguments = loaderArguments(loaderSettings)
+    # Iterable datasets perform their own shuffling.
+    # Multi-fidelity search trains early rungs on subsets, which are selected through the sampler.
+    iterableFlag = isinstance(trainingDataset, MyIterableDataset)
+    sampler = SubsetSampler(len(trainingDataset)) if MULTI_FIDELITY and not iterableFlag else None
+    trainingDataloader = DataLoader(dataset = trainingDataset, batch_size = BATCH_SIZE, shuffle = not iterableFlag and sampler is None,
+                                    sampler = sampler, collate_fn = collateFunction, **streamingArguments(trainingDataset, arguments))
     # Shuffling is not required during validation.
-    validationDataloader = DataLoader(dataset = validationDataset, batch_size = BATCH_SIZE, shuffle = False, pin_memory = True, num_workers = 4)
+    validationDataloader = DataLoader(dataset = validationDataset, batch_size = BATCH_SIZE, shuffle = False, collate_fn = validationCollateFunction,
+                                      **streamingArguments(validationDataset, arguments))
     return trainingDataloader, validationDataloader
 
 def getOptimizer(parameters, learningRate):
@@ -31,12 +106,21 @@ def getOptimizer(parameters, learningRate):
     mainScheduler = ReduceLROnPlateau(optimizer, mode = 'min', factor = 0.9, min_lr = 1e-6)
     return optimizer, warmupScheduler, mainScheduler
 
-def initializeModel(inChannels, numClasses, device):
+def initializeModel(inChannels, numClasses, device, checkpointLevels = CHECKPOINT_LEVELS, channelsLastFlag = CHANNELS_LAST):
     # Model shall be sent to GPU to expedite execution.
-    model = UNet(inChannels = inChannels, numClasses = numClasses).to(device)
+    model = UNet(inChannels = inChannels, numClasses = numClasses, checkpointLevels = checkpointLevels).to(device)
+    # Convolution kernels of oneDNN and cuDNN are faster on NHWC tensors, which convolutions then also return.
+    if channelsLastFlag:
+        model = model.to(memory_format = channels_last)
     model.apply(initializeWeights)
     return model
 
+def compileModel(model):
+    # Compiled module shares its parameters with the eager one, so in-place reinitialization does not invalidate the compiled graphs.
+    # Graphs are only built during the first steps, for each batch size encountered.
+    print('Model will be compiled during the first training steps.')
+    return compile(model)
+
 def setupDevice():
     if is_available():
         device = 'cuda'
@@ -48,7 +132,8 @@ def setupDevice():
 
 def initializeLossFunction():
     # A weighted combination of cross-entropy and Dice loss is used. 
-    return LossFunction()
+    # Fused variant shares a single softmax pass between both terms, and its Dice term is differentiable.
+    return FusedLossFunction() if FUSED_LOSS else LossFunction()
 
 def setSeed(seed):
     # Set global seet to ensure reproducibility.
@@ -1,54 +1,77 @@
 from tqdm import tqdm
-from torch import no_grad
+from time import perf_counter
+from torch import no_grad, autocast, uint8, int64, bfloat16
 from optuna.exceptions import TrialPruned
 from trainingVisualization import logResults, plotMetrics
-from trainingFinalization import saveTrialData
-from computeMetrics import computeMetrics
-from configurationFile import WARMUP, PATIENCE
+from trainingFinalization import saveTrialData, saveProfileData, saveCheckpoint, loadCheckpoint, getRNGStates, setRNGStates, getCheckpointPath
+from StageProfiler import profileOffsets, aggregateProfiles
+from MetricAccumulator import MetricAccumulator
+from multiFidelity import fidelityAt, resizeBatch, allocatedCores
+from configurationFile import WARMUP, PATIENCE, PROFILE_PIPELINE, PROFILING_PATH, MIXED_PRECISION, MICRO_BATCH_SIZE
+from configurationFile import CHECKPOINT_INTERVAL
 
-def trainOneEpoch(model, trainingDataloader, optimizer, criterion, device):
+def prepareBatch(data, device):
+    # Send data to GPU. Copies from pinned memory do not block the host.
+    image = data[0].to(device, non_blocking = True)
+    groundTruth = data[1].to(device, non_blocking = True)
+    # Compact uint8 batches are scaled and widened only after the transfer, which preserves their memory format.
+    if image.dtype == uint8:
+        image = image.float().div_(255)
+    if groundTruth.dtype != int64:
+        groundTruth = groundTruth.long()
+    return image, groundTruth
+
+def precisionContext(device, mixedPrecisionFlag):
+    # Matrix multiplications and convolutions run in bfloat16, whereas reductions and the loss remain in float32.
+    # Unlike float16, bfloat16 has the exponent range of float32, so no gradient scaling is required.
+    return autocast(device_type = device, dtype = bfloat16, enabled = mixedPrecisionFlag)
+
+def trainOneEpoch(model, trainingDataloader, optimizer, criterion, device, mixedPrecisionFlag = False, microBatchSize = None, scale = 1):
     model.train()
-    aggregatedMetrics = {'Loss': 0, 'Dice Coefficient': 0, 'IoU': 0, 'Accuracy': 0, 'Precision': 0}
+    metricAccumulator = MetricAccumulator(device)
 
     for data in tqdm(trainingDataloader, desc = 'Training'):
-        # Send data to GPU.
-        image = data[0].to(device)
-        groundTruth = data[1].to(device)
+        image, groundTruth = resizeBatch(*prepareBatch(data, device), scale)
         optimizer.zero_grad()
-        # Input tensor form: (B, C, H, W)
-        # Ground truth tensor form: (B, H, W)
-        prediction = model(image)
-        loss = criterion(prediction, groundTruth)
-        aggregatedMetrics['Loss'] += loss.item()
-        loss.backward()
+        # Batches may be split into micro-batches, whose gradients are accumulated before a single optimizer step.
+        # Only the activations of one micro-batch are kept at a time, which bounds peak memory.
+        batchSize = image.shape[0]
+        for microImage, microGroundTruth in zip(image.split(microBatchSize or batchSize), groundTruth.split(microBatchSize or batchSize)):
+            # Input tensor form: (B, C, H, W)
+            # Ground truth tensor form: (B, H, W)
+            with precisionContext(device, mixedPrecisionFlag):
+                prediction = model(microImage)
+                loss = criterion(prediction, microGroundTruth)
+            # Losses are averaged per micro-batch, so they are weighted by their share of the batch to recover the batch gradient.
+            (loss * microImage.shape[0] / batchSize).backward()
+            # Accumulate metrics.
+            metricAccumulator.update(prediction.detach(), microGroundTruth, loss)
         optimizer.step()
-        # Compute metrics.
-        batchMetrics = computeMetrics(prediction, groundTruth)
-        for key in batchMetrics:
-            aggregatedMetrics[key] += batchMetrics[key]
 
-    averagedMetrics = {key: value / len(trainingDataloader) for key, value in aggregatedMetrics.items()}
-    return averagedMetrics
+    return metricAccumulator.compute()
 
-def validateOneEpoch(model, validationDataloader, criterion, device):
+def validateOneEpoch(model, validationDataloader, criterion, device, mixedPrecisionFlag = False, scale = 1):
     model.eval()
-    aggregatedMetrics = {'Loss': 0, 'Dice Coefficient': 0, 'IoU': 0, 'Accuracy': 0, 'Precision': 0}
+    metricAccumulator = MetricAccumulator(device)
 
     with no_grad():
         for data in tqdm(validationDataloader, desc = 'Validation'):
-            image = data[0].to(device)
-            groundTruth = data[1].to(device)
-            prediction = model(image)
-            loss = criterion(prediction, groundTruth)
-            aggregatedMetrics['Loss'] += loss.item()
-            batchMetrics = computeMetrics(prediction, groundTruth)
-            for key in batchMetrics:
-                aggregatedMetrics[key] += batchMetrics[key]
-
-    averagedMetrics = {key: value / len(validationDataloader) for key, value in aggregatedMetrics.items()}
-    return averagedMetrics
-
-def trainingLoop(model, trial, trainingDataloader, validationDataloader, optimizer, warmupScheduler, mainScheduler, criterion, device):
+            image, groundTruth = resizeBatch(*prepareBatch(data, device), scale)
+            with precisionContext(device, mixedPrecisionFlag):
+                prediction = model(image)
+                loss = criterion(prediction, groundTruth)
+            metricAccumulator.update(prediction, groundTruth, loss)
+
+    return metricAccumulator.compute()
+
+def removeCheckpoints(*paths):
+    # Checkpoints are only required while a trial is running.
+    for path in paths:
+        if path.exists():
+            path.unlink()
+
+def trainingLoop(model, trial, trainingDataloader, validationDataloader, optimizer, warmupScheduler, mainScheduler, criterion, device,
+                 mixedPrecisionFlag = MIXED_PRECISION, microBatchSize = MICRO_BATCH_SIZE, fidelitySchedule = None, profilingPath = PROFILING_PATH):
     trainingLossPlot = []
     validationLossPlot = []
     validationDiceScorePlot = []
@@ -57,10 +80,53 @@ def trainingLoop(model, trial, trainingDataloader, validationDataloader, optimiz
     bestValidationLoss = float('inf')
     patienceCounter = 0
     maxEpochs = 0
+    # Stage timings written by the DataLoader workers are read incrementally, starting from the end of the previous trial.
+    offsets = profileOffsets(profilingPath) if PROFILE_PIPELINE else {}
 
+    # Wall time of every epoch, together with its fidelity, from which the savings of multi-fidelity search are estimated.
+    # Running list is only kept in the checkpoints. It is stored in the study once the trial ends, since every update rewrites it in the journal.
+    epochCosts = []
+
+    # Trials interrupted by a crash are re-enqueued by trainModel.py, and continue from the last checkpoint of the interrupted trial.
+    checkpointPath = getCheckpointPath(trial.study.study_name, trial.number)
+    resumePath = getCheckpointPath(trial.study.study_name, trial.user_attrs['resumeFrom']) if 'resumeFrom' in trial.user_attrs else checkpointPath
+    if resumePath.exists():
+        state = loadCheckpoint(resumePath)
+        # Weights are stored without the prefix of the compiled wrapper, so checkpoints remain valid when COMPILE_MODEL is changed.
+        getattr(model, '_orig_mod', model).load_state_dict(state['model'])
+        optimizer.load_state_dict(state['optimizer'])
+        warmupScheduler.load_state_dict(state['warmupScheduler'])
+        mainScheduler.load_state_dict(state['mainScheduler'])
+        trainingLossPlot, validationLossPlot, validationDiceScorePlot, validationIoUScorePlot = state['plots']
+        bestValidationLoss, patienceCounter, maxEpochs = state['bestValidationLoss'], state['patienceCounter'], state['epoch']
+        # Only the random states of the main process are restored, see getRNGStates.
+        setRNGStates(state['RNGStates'])
+        epochCosts = state['epochCosts']
+        # Intermediate values belong to the interrupted trial, so they are reported again for the pruner.
+        for epoch, validationLoss in enumerate(validationLossPlot, start = 1):
+            trial.report(validationLoss, epoch)
+        print(f'Trial {trial.number} resumed from {resumePath} after epoch {maxEpochs}.')
+
+    fidelityLevel, _ = fidelityAt(fidelitySchedule, maxEpochs)
     while True:
-        trainingMetrics = trainOneEpoch(model, trainingDataloader, optimizer, criterion, device)
-        validationMetrics = validateOneEpoch(model, validationDataloader, criterion, device)
+        # Early epochs may train at reduced resolution and on a stratified subset, until the trial is promoted by the pruner.
+        level, fidelity = fidelityAt(fidelitySchedule, maxEpochs + 1)
+        if level != fidelityLevel:
+            # Losses of different fidelities are not comparable, so early stopping and plateau detection start afresh.
+            fidelityLevel = level
+            bestValidationLoss = float('inf')
+            patienceCounter = 0
+            mainScheduler.best = mainScheduler.mode_worse
+            mainScheduler.num_bad_epochs = 0
+            print(f'Trial {trial.number} continues at resolution scale {fidelity["scale"]} on {fidelity["fraction"]:.0%} of the training subset.')
+        if hasattr(trainingDataloader.sampler, 'setSubset'):
+            trainingDataloader.sampler.setSubset(fidelity['indices'])
+
+        epochStart = perf_counter()
+        trainingMetrics = trainOneEpoch(model, trainingDataloader, optimizer, criterion, device, mixedPrecisionFlag, microBatchSize,
+                                        fidelity['scale'])
+        validationMetrics = validateOneEpoch(model, validationDataloader, criterion, device, mixedPrecisionFlag, fidelity['scale'])
+        epochCosts.append((fidelity['scale'], fidelity['fraction'], perf_counter() - epochStart, allocatedCores()))
         currentLR = optimizer.param_groups[0]['lr']
         maxEpochs += 1
         if maxEpochs < WARMUP:
@@ -75,10 +141,15 @@ def trainingLoop(model, trial, trainingDataloader, validationDataloader, optimiz
         validationIoUScorePlot.append(validationMetrics['IoU'])
         logResults(maxEpochs, currentLR, trainingMetrics, validationMetrics)
         saveTrialData(maxEpochs, currentLR, trainingMetrics, validationMetrics, trial.number)
+        if PROFILE_PIPELINE:
+            saveProfileData(maxEpochs, aggregateProfiles(profilingPath, offsets), trial.number)
         
         trial.report(validationMetrics['Loss'], maxEpochs)
         if trial.should_prune():
             # Get rid of unpromising trials early, to save on computational resources.
+            removeCheckpoints(checkpointPath, resumePath)
+            if fidelitySchedule is not None:
+                trial.set_user_attr('epochCosts', epochCosts)
             raise TrialPruned()
 
         # Models train indefinitely, until validation loss stops improving.
@@ -90,7 +161,19 @@ def trainingLoop(model, trial, trainingDataloader, validationDataloader, optimiz
         if patienceCounter >= PATIENCE:
             print(f'Early stopping triggered after {maxEpochs} epochs.')
             break
+
+        # Checkpoints are only taken at epoch boundaries of trials that continue.
+        if maxEpochs % CHECKPOINT_INTERVAL == 0:
+            saveCheckpoint({'model': getattr(model, '_orig_mod', model).state_dict(), 'optimizer': optimizer.state_dict(), 'warmupScheduler': warmupScheduler.state_dict(),
+                            'mainScheduler': mainScheduler.state_dict(), 'epoch': maxEpochs, 'bestValidationLoss': bestValidationLoss,
+                            'patienceCounter': patienceCounter, 'RNGStates': getRNGStates(), 'epochCosts': epochCosts,
+                            'plots': (trainingLossPlot, validationLossPlot, validationDiceScorePlot, validationIoUScorePlot)}, checkpointPath)
+            if resumePath != checkpointPath and resumePath.exists():
+                resumePath.unlink()
     
     # Plot training metrics after training ends, to decrease computational overhead.
     PNGPath = plotMetrics(trainingLossPlot, validationLossPlot, validationDiceScorePlot, validationIoUScorePlot, trial.number)
+    removeCheckpoints(checkpointPath, resumePath)
+    if fidelitySchedule is not None:
+        trial.set_user_attr('epochCosts', epochCosts)
     return trainingMetrics, validationMetrics, PNGPath, maxEpochs
\ No newline at end of file
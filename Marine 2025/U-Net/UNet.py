@@ -1,14 +1,38 @@
-from torch.nn import Module, Conv2d
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from torch import is_grad_enabled
+from torch.nn import Module, Conv2d, BatchNorm2d
+from torch.utils.checkpoint import checkpoint
 from UpSample import UpSample
 from DownSample import DownSample
 from BlueArrow import BlueArrow
 
+@contextmanager
+def frozenStatistics(module):
+    # Recomputed forward passes must not update the running statistics of batch normalization a second time.
+    # Momentum of zero leaves the running statistics unchanged.
+    layers = [layer for layer in module.modules() if isinstance(layer, BatchNorm2d)]
+    momenta = [layer.momentum for layer in layers]
+    for layer in layers:
+        layer.momentum = 0.0
+    try:
+        yield
+    finally:
+        for layer, momentum in zip(layers, momenta):
+            layer.momentum = momentum
+
+def checkpointContexts(module):
+    return nullcontext(), frozenStatistics(module)
+
 class UNet(Module):
     # Architecture largely based on the original paper.
     # Network output is of the form (B, C, H, W).
-    def __init__(self, inChannels, numClasses):
+    def __init__(self, inChannels, numClasses, checkpointLevels = 0):
         super().__init__()
         self.numClasses = numClasses
+        # Activations of the encoder and decoder stages of the first checkpointLevels resolutions are not stored during training.
+        # They are instead recomputed in the backward pass, trading computation for memory. Level 4 is the bottleneck.
+        self.checkpointLevels = checkpointLevels
 
         self.downConvolutionOne = DownSample(inChannels, 64)
         self.downConvolutionTwo = DownSample(64, 128)
@@ -24,18 +48,23 @@ class UNet(Module):
 
         self.output = Conv2d(64, numClasses, kernel_size = 1)
         
+    def runStage(self, stage, level, *inputs):
+        if self.training and level < self.checkpointLevels and is_grad_enabled():
+            return checkpoint(stage, *inputs, use_reentrant = False, context_fn = partial(checkpointContexts, stage))
+        return stage(*inputs)
+
     def forward(self, x):
-        downOne, poolingOne = self.downConvolutionOne(x)
-        downTwo, poolingTwo = self.downConvolutionTwo(poolingOne)
-        downThree, poolingThree = self.downConvolutionThree(poolingTwo)
-        downFour, poolingFour = self.downConvolutionFour(poolingThree)
+        downOne, poolingOne = self.runStage(self.downConvolutionOne, 0, x)
+        downTwo, poolingTwo = self.runStage(self.downConvolutionTwo, 1, poolingOne)
+        downThree, poolingThree = self.runStage(self.downConvolutionThree, 2, poolingTwo)
+        downFour, poolingFour = self.runStage(self.downConvolutionFour, 3, poolingThree)
 
-        bottleneck = self.bottleneck(poolingFour)
+        bottleneck = self.runStage(self.bottleneck, 4, poolingFour)
 
-        upOne = self.upConvolutionOne(bottleneck, downFour)
-        upTwo = self.upConvolutionTwo(upOne, downThree)
-        upThree = self.upConvolutionThree(upTwo, downTwo)
-        upFour = self.upConvolutionFour(upThree, downOne)
+        upOne = self.runStage(self.upConvolutionOne, 3, bottleneck, downFour)
+        upTwo = self.runStage(self.upConvolutionTwo, 2, upOne, downThree)
+        upThree = self.runStage(self.upConvolutionThree, 1, upTwo, downTwo)
+        upFour = self.runStage(self.upConvolutionFour, 0, upThree, downOne)
 
         output = self.output(upFour)
         return output
\ No newline at end of file
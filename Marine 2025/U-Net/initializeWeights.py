@@ -13,4 +13,6 @@ def initializeWeights(module):
     elif isinstance(module, BatchNorm2d):
         # Identity mapping (no effect).
         constant_(module.weight, 1)
-        constant_(module.bias, 0)
\ No newline at end of file
+        constant_(module.bias, 0)
+        # Running statistics are also cleared, so that a model reused across trials starts afresh.
+        module.reset_running_stats()
\ No newline at end of file
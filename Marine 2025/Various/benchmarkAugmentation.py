@@ -0,0 +1,36 @@
+from time import perf_counter
+from torch.utils.data import DataLoader
+from MyDataset import MyDataset
+from BatchAugmentation import BatchAugmentation
+from configurationFile import BATCH_SIZE, TRAINING_PATH, PACKED_DATASET, DRAFT_DECODING
+
+def measureThroughput(dataloader, numBatches):
+    # The first batch is excluded, since it includes worker start-up.
+    iterator = iter(dataloader)
+    next(iterator)
+    numSamples = 0
+    start = perf_counter()
+    for _ in range(numBatches):
+        images, _ = next(iterator)
+        numSamples += images.shape[0]
+    return numSamples / (perf_counter() - start)
+
+def benchmarkAugmentation(rootPath, numBatches, numWorkers):
+    # Compare per-sample albumentations against batched augmentation after collation, on the same data source.
+    results = {}
+    for batchAugmentationFlag in [False, True]:
+        dataset = MyDataset(rootPath, augmentationFlag = True, packedFlag = PACKED_DATASET, draftFlag = DRAFT_DECODING,
+                            batchAugmentationFlag = batchAugmentationFlag)
+        collateFunction = BatchAugmentation() if batchAugmentationFlag else None
+        dataloader = DataLoader(dataset = dataset, batch_size = BATCH_SIZE, shuffle = True, num_workers = numWorkers,
+                                collate_fn = collateFunction)
+        label = 'Batched' if batchAugmentationFlag else 'Per-sample'
+        results[label] = measureThroughput(dataloader, min(numBatches, len(dataloader) - 1))
+        print(f'{label} augmentation: {results[label]:.1f} samples/sec.')
+
+    print(f'Speedup of batched augmentation: {results["Batched"] / results["Per-sample"]:.2f}x.')
+    return results
+
+if __name__ == '__main__':
+    # Multiprocessing guard.
+    benchmarkAugmentation(TRAINING_PATH, numBatches = 50, numWorkers = 4)
\ No newline at end of file
@@ -0,0 +1,62 @@
+from time import perf_counter
+from torch import randn, randint, manual_seed
+from torch.autograd.graph import saved_tensors_hooks
+from torch.cuda import reset_peak_memory_stats, max_memory_allocated
+from trainingInitialization import initializeModel, initializeLossFunction, getOptimizer, setupDevice
+from benchmarkReport import synchronizeDevice, saveReport
+from configurationFile import SEED, NUM_CLASSES, BATCH_SIZE, RESOLUTION
+
+def savedActivationBytes(model, criterion, image, groundTruth):
+    # Tensors saved for the backward pass are counted once per storage, which approximates activation memory on any device.
+    # Tensors saved inside checkpointed stages are not kept, so they are not seen by the hooks.
+    storages = {}
+    def pack(tensor):
+        storage = tensor.untyped_storage()
+        storages[storage.data_ptr()] = storage.nbytes()
+        return tensor
+
+    with saved_tensors_hooks(pack, lambda tensor: tensor):
+        loss = criterion(model(image), groundTruth)
+    loss.backward()
+    model.zero_grad()
+    return sum(storages.values())
+
+def measureStep(model, criterion, optimizer, image, groundTruth, device, numSteps):
+    # Peak memory is only reported by the CUDA allocator.
+    synchronizeDevice(device)
+    if device == 'cuda':
+        reset_peak_memory_stats()
+    start = perf_counter()
+    for _ in range(numSteps):
+        optimizer.zero_grad()
+        criterion(model(image), groundTruth).backward()
+        optimizer.step()
+    synchronizeDevice(device)
+    stepTime = (perf_counter() - start) / numSteps
+    peakMemory = max_memory_allocated() if device == 'cuda' else None
+    return stepTime, peakMemory
+
+def benchmarkCheckpointing(device, batchSize, numSteps):
+    results = []
+    manual_seed(SEED)
+    image = randn(batchSize, 3, *RESOLUTION, device = device)
+    groundTruth = randint(0, NUM_CLASSES, (batchSize, *RESOLUTION), device = device)
+    for checkpointLevels in range(6):
+        model = initializeModel(inChannels = 3, numClasses = NUM_CLASSES, device = device, checkpointLevels = checkpointLevels)
+        model.train()
+        criterion = initializeLossFunction()
+        optimizer, _, _ = getOptimizer(model.parameters(), 1e-4)
+        activationBytes = savedActivationBytes(model, criterion, image, groundTruth)
+        stepTime, peakMemory = measureStep(model, criterion, optimizer, image, groundTruth, device, numSteps)
+        result = {'checkpointLevels': checkpointLevels, 'stepSeconds': round(stepTime, 3), 'savedActivationMB': round(activationBytes / 2**20, 1),
+                  'peakMemoryMB': round(peakMemory / 2**20, 1) if peakMemory is not None else None}
+        results.append(result)
+        print(f'Checkpoint levels {checkpointLevels}: {stepTime:.2f} s/step, {result["savedActivationMB"]:.0f} MB of saved activations'
+              + (f', {result["peakMemoryMB"]:.0f} MB peak.' if peakMemory is not None else '.'))
+        del model, optimizer
+    return results
+
+if __name__ == '__main__':
+    device = setupDevice()
+    results = benchmarkCheckpointing(device, BATCH_SIZE, numSteps = 3)
+    saveReport('checkpointing', {'batchSize': BATCH_SIZE, 'resolution': RESOLUTION, 'results': results}, device)
\ No newline at end of file
@@ -0,0 +1,46 @@
+from time import perf_counter
+from torch import randn, randint, manual_seed
+from trainingInitialization import initializeModel, initializeLossFunction, getOptimizer, setupDevice, compileModel
+from benchmarkReport import synchronizeDevice, saveReport
+from configurationFile import SEED, NUM_CLASSES, BATCH_SIZE, RESOLUTION
+
+def timeStep(model, criterion, optimizer, image, groundTruth, device):
+    start = perf_counter()
+    optimizer.zero_grad()
+    criterion(model(image), groundTruth).backward()
+    optimizer.step()
+    synchronizeDevice(device)
+    return perf_counter() - start
+
+def benchmarkCompile(device, batchSize, numSteps):
+    # First step of the compiled model includes compilation, whereas the following steps show the steady-state speed.
+    manual_seed(SEED)
+    image = randn(batchSize, 3, *RESOLUTION, device = device)
+    groundTruth = randint(0, NUM_CLASSES, (batchSize, *RESOLUTION), device = device)
+    results = {}
+    for compileFlag in [False, True]:
+        model = initializeModel(inChannels = 3, numClasses = NUM_CLASSES, device = device)
+        model.train()
+        criterion = initializeLossFunction()
+        optimizer, _, _ = getOptimizer(model.parameters(), 1e-4)
+        trainingModel = compileModel(model) if compileFlag else model
+        firstStep = timeStep(trainingModel, criterion, optimizer, image, groundTruth, device)
+        stepTimes = [timeStep(trainingModel, criterion, optimizer, image, groundTruth, device) for _ in range(numSteps)]
+        label = 'Compiled' if compileFlag else 'Eager'
+        results[label] = {'firstStepSeconds': round(firstStep, 2), 'stepSeconds': round(sum(stepTimes) / numSteps, 3)}
+        print(f'{label}: first step {firstStep:.1f} s, then {results[label]["stepSeconds"]:.2f} s/step.')
+
+    # Compilation pays off once the time saved per step has recovered its overhead.
+    compileTime = results['Compiled']['firstStepSeconds'] - results['Eager']['firstStepSeconds']
+    savedTime = results['Eager']['stepSeconds'] - results['Compiled']['stepSeconds']
+    results['compileSeconds'] = round(compileTime, 2)
+    results['speedup'] = round(results['Eager']['stepSeconds'] / results['Compiled']['stepSeconds'], 3)
+    results['breakEvenSteps'] = round(compileTime / savedTime) if savedTime > 0 else None
+    print(f'Compilation took {compileTime:.1f} s, for a steady-state speedup of {results["speedup"]:.2f}x '
+          f'(break-even after {results["breakEvenSteps"]} steps).')
+    return results
+
+if __name__ == '__main__':
+    device = setupDevice()
+    results = benchmarkCompile(device, BATCH_SIZE, numSteps = 10)
+    saveReport('compile', {'batchSize': BATCH_SIZE, 'resolution': RESOLUTION, 'results': results}, device)
\ No newline at end of file
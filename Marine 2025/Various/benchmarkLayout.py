@@ -0,0 +1,48 @@
+from time import perf_counter
+from torch import randn, randint, manual_seed, channels_last
+from trainingInitialization import initializeModel, initializeLossFunction, setupDevice
+from benchmarkReport import synchronizeDevice, saveReport
+from configurationFile import SEED, NUM_CLASSES, BATCH_SIZE, RESOLUTION
+
+def measureLayout(model, criterion, image, groundTruth, device, numSteps):
+    # Forward and backward passes are timed separately, since layout affects the gradient kernels differently.
+    forwardTime = 0
+    backwardTime = 0
+    for step in range(numSteps + 1):
+        model.zero_grad()
+        synchronizeDevice(device)
+        start = perf_counter()
+        loss = criterion(model(image), groundTruth)
+        synchronizeDevice(device)
+        middle = perf_counter()
+        loss.backward()
+        synchronizeDevice(device)
+        # First step is a warm-up, during which kernels are selected.
+        if step > 0:
+            forwardTime += middle - start
+            backwardTime += perf_counter() - middle
+    return forwardTime / numSteps, backwardTime / numSteps
+
+def benchmarkLayout(device, batchSize, numSteps):
+    manual_seed(SEED)
+    image = randn(batchSize, 3, *RESOLUTION, device = device)
+    groundTruth = randint(0, NUM_CLASSES, (batchSize, *RESOLUTION), device = device)
+    results = {}
+    for channelsLastFlag in [False, True]:
+        model = initializeModel(inChannels = 3, numClasses = NUM_CLASSES, device = device, channelsLastFlag = channelsLastFlag)
+        model.train()
+        criterion = initializeLossFunction()
+        layoutImage = image.contiguous(memory_format = channels_last) if channelsLastFlag else image
+        forwardTime, backwardTime = measureLayout(model, criterion, layoutImage, groundTruth, device, numSteps)
+        label = 'NHWC' if channelsLastFlag else 'NCHW'
+        results[label] = {'forwardSeconds': round(forwardTime, 3), 'backwardSeconds': round(backwardTime, 3)}
+        print(f'{label}: forward {forwardTime:.2f} s, backward {backwardTime:.2f} s.')
+
+    speedup = sum(results['NCHW'].values()) / sum(results['NHWC'].values())
+    print(f'Speedup of channels-last: {speedup:.2f}x.')
+    return results
+
+if __name__ == '__main__':
+    device = setupDevice()
+    results = benchmarkLayout(device, BATCH_SIZE, numSteps = 5)
+    saveReport('layout', {'batchSize': BATCH_SIZE, 'resolution': RESOLUTION, 'results': results}, device)
\ No newline at end of file
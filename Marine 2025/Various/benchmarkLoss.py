@@ -0,0 +1,36 @@
+from time import perf_counter
+from torch import randn, randint, manual_seed
+from torch.cuda import is_available
+from LossFunction import LossFunction
+from FusedLossFunction import FusedLossFunction
+from benchmarkReport import synchronizeDevice, saveReport
+from configurationFile import SEED, NUM_CLASSES
+
+def measureLoss(criterion, logits, groundTruth, device, numRepeats):
+    # Forward and backward passes are timed together, since the backward pass is where the fused loss saves most.
+    for _ in range(2):
+        criterion(logits, groundTruth).backward()
+    synchronizeDevice(device)
+    start = perf_counter()
+    for _ in range(numRepeats):
+        logits.grad = None
+        criterion(logits, groundTruth).backward()
+    synchronizeDevice(device)
+    return (perf_counter() - start) / numRepeats
+
+def benchmarkLoss(device, inputShape, numRepeats):
+    manual_seed(SEED)
+    logits = randn(inputShape, device = device, requires_grad = True)
+    groundTruth = randint(0, NUM_CLASSES, (inputShape[0], *inputShape[2:]), device = device)
+    results = {}
+    for label, criterion in [('LossFunction', LossFunction()), ('FusedLossFunction', FusedLossFunction())]:
+        results[label] = round(measureLoss(criterion, logits, groundTruth, device, numRepeats) * 1000, 2)
+        print(f'{label}: {results[label]:.1f} ms per forward and backward pass.')
+    print(f'Speedup of fused loss: {results["LossFunction"] / results["FusedLossFunction"]:.2f}x.')
+    return results
+
+if __name__ == '__main__':
+    device = 'cuda' if is_available() else 'cpu'
+    inputShape = (16, NUM_CLASSES, 512, 512)
+    results = benchmarkLoss(device, inputShape, numRepeats = 10)
+    saveReport('loss', {'inputShape': inputShape, 'millisecondsPerPass': results}, device)
\ No newline at end of file
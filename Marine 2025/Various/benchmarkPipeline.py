@@ -0,0 +1,107 @@
+import numpy as np
+from argparse import ArgumentParser
+from pathlib import Path
+from time import perf_counter
+from torch.utils.data import DataLoader
+from MyDataset import MyDataset
+from MyIterableDataset import MyIterableDataset
+from MyTileDataset import MyTileDataset
+from DatasetPacker import DatasetPacker
+from ShardWriter import ShardWriter
+from TileIndex import TileIndex
+from SyntheticDataset import SyntheticDataset
+from benchmarkReport import saveReport
+from configurationFile import MAX_CROP_SIDE, TRAINING_PATH, BENCHMARKS_PATH
+
+STORAGE_FORMATS = ['Files', 'Draft', 'Packed', 'Cache', 'Sharded', 'Tiled']
+
+def formatAvailable(rootPath, storageFormat):
+    # Derived formats are only benchmarked once their files have been created.
+    requiredFiles = {'Packed': rootPath / 'Packed' / 'Index.json', 'Sharded': rootPath / 'Shards' / 'Index.json',
+                     'Tiled': rootPath / 'Packed Native' / 'Tiles.npz'}
+    return storageFormat not in requiredFiles or requiredFiles[storageFormat].exists()
+
+def createDataset(rootPath, storageFormat, augmentationFlag):
+    if storageFormat == 'Sharded':
+        return MyIterableDataset(rootPath, augmentationFlag = augmentationFlag, shuffleFlag = augmentationFlag)
+    if storageFormat == 'Tiled':
+        return MyTileDataset(rootPath, augmentationFlag = augmentationFlag)
+    return MyDataset(rootPath, augmentationFlag = augmentationFlag, packedFlag = storageFormat == 'Packed', draftFlag = storageFormat == 'Draft',
+                     cacheFlag = storageFormat == 'Cache')
+
+def measurePipeline(dataset, batchSize, numWorkers, numBatches):
+    # Batches are only drawn, without a model in the loop, so that the data path is measured in isolation.
+    dataloader = DataLoader(dataset = dataset, batch_size = batchSize, shuffle = not isinstance(dataset, MyIterableDataset),
+                            num_workers = numWorkers, drop_last = True)
+    numBatches = min(numBatches, len(dataloader) - 1)
+    if numBatches < 1:
+        return None
+
+    # The first batch is reported separately, since it includes worker start-up.
+    start = perf_counter()
+    iterator = iter(dataloader)
+    next(iterator)
+    firstBatchTime = perf_counter() - start
+    latencies = []
+    for _ in range(numBatches):
+        start = perf_counter()
+        next(iterator)
+        latencies.append(perf_counter() - start)
+    del iterator
+
+    latencies = np.array(latencies)
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return {'samplesPerSecond': round(float(numBatches * batchSize / latencies.sum()), 2), 'p50BatchMs': round(float(p50), 3),
+            'p99BatchMs': round(float(p99), 3), 'firstBatchSeconds': round(firstBatchTime, 3), 'numBatches': numBatches}
+
+def prepareSynthetic(rootPath, numSamples):
+    # Synthetic subset, together with every derived storage format, so that all formats can be compared on any machine.
+    if not (rootPath / 'Images').exists():
+        SyntheticDataset(rootPath, numSamples = numSamples)
+        DatasetPacker(rootPath, minimumSide = MAX_CROP_SIDE)
+        ShardWriter(rootPath, numShards = 16)
+        TileIndex(rootPath)
+
+def benchmarkPipeline(rootPath, storageFormats, augmentationFlags, workerCounts, batchSizes, numBatches):
+    results = []
+    for storageFormat in storageFormats:
+        if not formatAvailable(rootPath, storageFormat):
+            print(f'{storageFormat} format is not available in {rootPath}. Skipping format.')
+            continue
+        for augmentationFlag in augmentationFlags:
+            # Cached samples are deterministic, so they are never augmented.
+            if storageFormat == 'Cache' and augmentationFlag:
+                continue
+            dataset = createDataset(rootPath, storageFormat, augmentationFlag)
+            for numWorkers in workerCounts:
+                for batchSize in batchSizes:
+                    measurement = measurePipeline(dataset, batchSize, numWorkers, numBatches)
+                    if measurement is None:
+                        print(f'Subset is too small for batches of {batchSize}. Skipping configuration.')
+                        continue
+                    configuration = {'storageFormat': storageFormat, 'augmentation': augmentationFlag, 'numWorkers': numWorkers,
+                                     'batchSize': batchSize}
+                    results.append({**configuration, **measurement})
+                    print(f'{configuration}: {measurement["samplesPerSecond"]:.1f} samples/sec, '
+                          f'p50 {measurement["p50BatchMs"]:.1f} ms, p99 {measurement["p99BatchMs"]:.1f} ms.')
+    return results
+
+if __name__ == '__main__':
+    # Multiprocessing guard.
+    parser = ArgumentParser(description = 'Measure the throughput of the input pipeline, without a model in the loop.')
+    parser.add_argument('--root', type = str, default = str(TRAINING_PATH), help = 'Subset folder to read from.')
+    parser.add_argument('--synthetic', type = int, default = 0, help = 'Generate a synthetic subset of this many samples instead.')
+    parser.add_argument('--formats', nargs = '+', default = STORAGE_FORMATS, choices = STORAGE_FORMATS)
+    parser.add_argument('--workers', nargs = '+', type = int, default = [0, 2, 4, 8])
+    parser.add_argument('--batch-sizes', nargs = '+', type = int, default = [8, 16, 32])
+    parser.add_argument('--batches', type = int, default = 50, help = 'Measured batches per configuration.')
+    arguments = parser.parse_args()
+
+    if arguments.synthetic:
+        rootPath = BENCHMARKS_PATH / f'Synthetic {arguments.synthetic}'
+        prepareSynthetic(rootPath, arguments.synthetic)
+    else:
+        rootPath = Path(arguments.root)
+    results = benchmarkPipeline(rootPath, arguments.formats, [False, True], arguments.workers, arguments.batch_sizes, arguments.batches)
+
+    saveReport('pipeline', {'rootPath': str(rootPath), 'synthetic': arguments.synthetic > 0, 'results': results})
\ No newline at end of file
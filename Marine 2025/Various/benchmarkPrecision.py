@@ -0,0 +1,40 @@
+from time import perf_counter
+from trainingInitialization import getDataloaders, getOptimizer, initializeModel, initializeLossFunction, setupDevice, setSeed
+from trainingPreparation import trainOneEpoch, validateOneEpoch
+from benchmarkReport import saveReport
+from configurationFile import SEED, NUM_CLASSES
+
+def benchmarkPrecision(device, numEpochs, learningRate = 1e-4):
+    # Train the same model from the same seed in float32 and in bfloat16 autocast, on identical batches.
+    results = {}
+    for mixedPrecisionFlag in [False, True]:
+        setSeed(SEED)
+        model = initializeModel(inChannels = 3, numClasses = NUM_CLASSES, device = device)
+        criterion = initializeLossFunction()
+        optimizer, _, _ = getOptimizer(model.parameters(), learningRate)
+        trainingDataloader, validationDataloader = getDataloaders()
+        epochTimes = []
+        for epoch in range(numEpochs):
+            start = perf_counter()
+            trainOneEpoch(model, trainingDataloader, optimizer, criterion, device, mixedPrecisionFlag)
+            epochTimes.append(perf_counter() - start)
+            validationMetrics = validateOneEpoch(model, validationDataloader, criterion, device, mixedPrecisionFlag)
+
+        label = 'bfloat16' if mixedPrecisionFlag else 'float32'
+        # First epoch is excluded from the average when possible, since it includes worker start-up and kernel selection.
+        measuredTimes = epochTimes[1:] or epochTimes
+        results[label] = {'epochSeconds': round(sum(measuredTimes) / len(measuredTimes), 2),
+                          'validationDice': round(validationMetrics['Dice Coefficient'], 4), 'validationLoss': round(validationMetrics['Loss'], 4)}
+        print(f'{label}: {results[label]["epochSeconds"]:.1f} s/epoch, validation Dice {results[label]["validationDice"]:.4f}.')
+
+    speedup = results['float32']['epochSeconds'] / results['bfloat16']['epochSeconds']
+    print(f'Speedup of bfloat16 autocast: {speedup:.2f}x, '
+          f'Dice difference: {results["bfloat16"]["validationDice"] - results["float32"]["validationDice"]:+.4f}.')
+    return results
+
+if __name__ == '__main__':
+    # Multiprocessing guard.
+    device = setupDevice()
+    numEpochs = 5
+    results = benchmarkPrecision(device, numEpochs)
+    saveReport('precision', {'numEpochs': numEpochs, 'results': results}, device)
\ No newline at end of file
@@ -0,0 +1,24 @@
+from json import dump
+from os import cpu_count
+from platform import node, platform
+from datetime import datetime
+from torch import __version__ as torchVersion
+from torch.cuda import synchronize
+from configurationFile import BENCHMARKS_PATH
+
+def synchronizeDevice(device):
+    # GPU kernels run asynchronously, so timings must wait for them to complete.
+    if device == 'cuda':
+        synchronize()
+
+def saveReport(benchmarkName, report, device = None):
+    # Machine description allows results of different releases to be compared on like hardware only.
+    machine = {'node': node(), 'platform': platform(), 'cpuCount': cpu_count(), 'torchVersion': torchVersion}
+    if device is not None:
+        machine['device'] = device
+    BENCHMARKS_PATH.mkdir(parents = True, exist_ok = True)
+    reportPath = BENCHMARKS_PATH / f'{benchmarkName}-{node()}-{datetime.now():%Y%m%d-%H%M%S}.json'
+    with open(reportPath, 'w') as f:
+        dump({'machine': machine, **report}, f, indent = 4)
+    print(f'Benchmark results saved to {reportPath}.')
+    return reportPath
\ No newline at end of file
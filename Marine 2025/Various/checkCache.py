@@ -0,0 +1,30 @@
+import numpy as np
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from MyDataset import MyDataset
+from SyntheticDataset import SyntheticDataset
+
+def checkCache(rootPath, numSamples):
+    # Builds the validation cache of a small synthetic subset, with profiling enabled, and compares it against uncached samples.
+    SyntheticDataset(rootPath, numSamples = numSamples, resolution = (600, 800))
+    profilingPath = rootPath.parent / 'Profiling'
+    dataset = MyDataset(rootPath, augmentationFlag = False, cacheFlag = True, profileFlag = True, profilingPath = profilingPath)
+    assert all(path.exists() for path in dataset.cachePaths), 'Cache files were not created.'
+    assert not list(dataset.cacheFolder.glob('*.tmp')), 'Temporary cache files were left behind.'
+
+    uncachedDataset = MyDataset(rootPath, augmentationFlag = False)
+    for index in range(len(dataset)):
+        cachedImage, cachedMask = dataset[index]
+        image, mask = uncachedDataset[index]
+        assert np.array_equal(cachedImage.numpy(), image.numpy()), f'Cached image {index} differs from the uncached one.'
+        assert np.array_equal(cachedMask.numpy(), mask.numpy()), f'Cached mask {index} differs from the uncached one.'
+
+    # Second construction must reuse the existing cache rather than rebuilding it.
+    modificationTime = dataset.cachePaths[0].stat().st_mtime_ns
+    MyDataset(rootPath, augmentationFlag = False, cacheFlag = True)
+    assert dataset.cachePaths[0].stat().st_mtime_ns == modificationTime, 'Cache was rebuilt although it already existed.'
+    print(f'Cache of {len(dataset)} samples built and verified at {dataset.cacheFolder}.')
+
+if __name__ == '__main__':
+    with TemporaryDirectory() as folder:
+        checkCache(Path(folder) / 'Subset', numSamples = 4)
\ No newline at end of file
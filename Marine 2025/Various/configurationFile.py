@@ -15,18 +15,76 @@ CLASS_DICTIONARY = {'Clean Hull': {'index': 0, 'color': [0, 255, 0]},
 # Project configuration variables.
 SEED = 4
 RESOLUTION = (512, 512)
+# RandomSizedCrop may request a square window of up to twice the target resolution.
+MAX_CROP_SIDE = 2*RESOLUTION[0]
 NUM_CLASSES = len(CLASS_DICTIONARY)
 SPLIT_RATIOS = (0.8, 0.1, 0.1)
 BATCH_SIZE = 16
 WARMUP = 10
 PATIENCE = 50
 
+# Data pipeline options.
+# Store new masks in the bit-packed format of maskCodec.py, instead of NPY files.
+COMPACT_MASKS = True
+# Read pre-decoded samples from the memory-mapped store written by DatasetPacker.py.
+PACKED_DATASET = False
+# Decode JPEG files at reduced resolution, using the DCT-domain scaling of the decoder.
+DRAFT_DECODING = False
+# Augment whole training batches after collation, instead of individual samples.
+BATCH_AUGMENTATION = False
+# DataLoader workers, prefetch depth, worker persistence and intra-op threads of the main process (None keeps the default).
+LOADER_SETTINGS = {'numWorkers': 4, 'prefetchFactor': 2, 'persistentWorkers': False, 'numThreads': None}
+# Search for the loader settings with the fastest training step on this machine, and cache them in AUTOTUNING_PATH.
+AUTOTUNE_DATALOADERS = False
+# Materialize resized validation samples once, in memory-mapped files reused by every epoch and trial.
+VALIDATION_CACHE = False
+# Transfer uint8 images and masks, which are converted to float and int64 only once on the device.
+UINT8_TRANSFER = False
+# Stream subsets from the sequential shard files written by ShardWriter.py.
+SHARDED_DATASET = False
+# Centre a share of the training crops on under-represented classes, using the index written by ClassLocationIndex.py.
+RARE_CLASS_CROPPING = False
+RARE_CLASS_RATE = 0.5
+# Train and validate on native-resolution tiles of RESOLUTION, indexed by TileIndex.py.
+TILED_DATASET = False
+# Record the time of every stage of the MyDataset pipeline, summarized per epoch in profileLog.json next to trialLog.json.
+PROFILE_PIPELINE = False
+
+# Training options.
+# Run the forward pass in bfloat16 autocast, which is accelerated by AMX and AVX-512 BF16 on recent Xeon processors.
+MIXED_PRECISION = False
+# Compute cross-entropy and a differentiable generalized soft Dice from one log-softmax pass, with FusedLossFunction.py.
+FUSED_LOSS = False
+# Split every batch of BATCH_SIZE into micro-batches of this size, accumulating gradients to keep the effective batch (None disables).
+MICRO_BATCH_SIZE = None
+# Recompute the activations of the UNet stages at the first CHECKPOINT_LEVELS resolutions during the backward pass (0 disables, 5 includes the bottleneck).
+CHECKPOINT_LEVELS = 0
+# Compile the model with torch.compile once per study, reusing the compiled graphs in every trial.
+COMPILE_MODEL = False
+# Keep the model weights and image batches in channels-last (NHWC) memory format.
+CHANNELS_LAST = False
+# Save a checkpoint of the running trial every CHECKPOINT_INTERVAL epochs, from which trainModel.py --resume continues.
+CHECKPOINT_INTERVAL = 1
+# Train early Hyperband rungs at reduced fidelity, given as (resolution scale, fraction of the training subset) per rung.
+# Rungs end after MIN_RESOURCE * REDUCTION_FACTOR^i epochs. Trials promoted past the last rung train at full fidelity.
+MULTI_FIDELITY = False
+FIDELITY_LEVELS = [(0.25, 0.25), (0.5, 0.5)]
+MIN_RESOURCE = 5
+REDUCTION_FACTOR = 3
+
 # Paths for the project.
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
-ALL_PATH = PROJECT_ROOT / 'INPUTS' / 'ALL'
+# Inputs may be redirected through the environment, e.g. to a dataset generated by SyntheticDataset.py.
+INPUTS_PATH = Path(getenv('INPUTS_PATH', PROJECT_ROOT / 'INPUTS'))
+ALL_PATH = INPUTS_PATH / 'ALL'
 METADATA_PATH = ALL_PATH / 'Masks' / 'Metadata.json'
-TRAINING_PATH = PROJECT_ROOT / 'INPUTS' / 'SPLIT' / 'TRAINING'
-VALIDATION_PATH = PROJECT_ROOT / 'INPUTS' / 'SPLIT' / 'VALIDATION'
-TESTING_PATH = PROJECT_ROOT / 'INPUTS' / 'SPLIT' / 'TESTING'
+TRAINING_PATH = INPUTS_PATH / 'SPLIT' / 'TRAINING'
+VALIDATION_PATH = INPUTS_PATH / 'SPLIT' / 'VALIDATION'
+TESTING_PATH = INPUTS_PATH / 'SPLIT' / 'TESTING'
 MODEL_PATH = PROJECT_ROOT / 'OUTPUTS' / 'Trained models'
-VISUALIZATIONS_PATH = PROJECT_ROOT / 'OUTPUTS' / 'Visualizations'
\ No newline at end of file
+VISUALIZATIONS_PATH = PROJECT_ROOT / 'OUTPUTS' / 'Visualizations'
+AUTOTUNING_PATH = PROJECT_ROOT / 'OUTPUTS' / 'Autotuning'
+PROFILING_PATH = MODEL_PATH / 'Profiling'
+BENCHMARKS_PATH = PROJECT_ROOT / 'OUTPUTS' / 'Benchmarks'
+CHECKPOINT_PATH = MODEL_PATH / 'Checkpoints'
+STUDY_STORAGE_PATH = MODEL_PATH / 'studyJournal.log'
\ No newline at end of file
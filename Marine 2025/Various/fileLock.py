@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+# Advisory locks are taken with flock on Linux, and with byte-range locks on Windows.
+try:
+    from fcntl import flock, LOCK_EX, LOCK_UN
+except ImportError:
+    from msvcrt import locking, LK_LOCK, LK_UNLCK
+    flock = None
+
+@contextmanager
+def fileLock(path):
+    # Exclusive lock guarding a file shared by several processes, e.g. parallel trial workers.
+    # Lock file itself persists. Locks are released by the operating system when their holder exits, so crashes never leave stale locks behind.
+    lockPath = path.with_suffix('.lock')
+    lockPath.parent.mkdir(parents = True, exist_ok = True)
+    with open(lockPath, 'a+') as lockFile:
+        if flock is not None:
+            flock(lockFile.fileno(), LOCK_EX)
+        else:
+            # Blocking byte-range locks give up after about ten seconds, and are therefore retried.
+            lockFile.seek(0)
+            while True:
+                try:
+                    locking(lockFile.fileno(), LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+        try:
+            yield
+        finally:
+            if flock is not None:
+                flock(lockFile.fileno(), LOCK_UN)
+            else:
+                lockFile.seek(0)
+                locking(lockFile.fileno(), LK_UNLCK, 1)
\ No newline at end of file